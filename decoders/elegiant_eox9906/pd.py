@@ -1,8 +1,10 @@
 import sigrokdecode as srd
-import math
-from functools import reduce
+from collections import deque
+from eox9906_common import OPTIONS, Annotations, FrameDecoder
 
-class Decoder(srd.Decoder):
+ANN = Annotations()
+
+class Decoder(FrameDecoder, srd.Decoder):
     """
     ASK capture from Elegiant EOX-9906 weather station transmitter
 
@@ -16,6 +18,13 @@ class Decoder(srd.Decoder):
     1.93ms pause (long)
 
     Preamble: 4 long pauses
+
+    OUTPUT_PYTHON: ['READING', (channel, battery ok, temperature C, humidity %)]
+    per decoded frame.
+
+    Frames are repeated in bursts. With repeat_window_ms set, a frame with
+    the payload of one decoded less than the window earlier is only
+    annotated as a repeat and put as ['REPEAT', (channel, copies so far)].
     """
     api_version = 3
     id = 'elegiant-eox9906'
@@ -36,79 +45,115 @@ class Decoder(srd.Decoder):
         ('bits', 'EOX 9906 bits'),
         ('fields', 'EOX 9906 bit fields'),
         ('decoded', 'EOX 9906 decoded values'),
+        ('repeat', 'EOX 9906 repeated frames'),
     )
     annotation_rows = (
         ('bits', 'Bits', (0,)),
         ('bit_fields', 'Bit fields', (1,)),
-        ('decoded', 'Decoded', (2,)),
+        ('decoded', 'Decoded', (2, 3)),
     )
+    options = OPTIONS
 
     def __init__(self, **kwargs):
+        self.samplerate = None
+        self.frame_pulses = []
+        # (first sample, copies) by payload
+        self.seen = {}
         self.reset()
 
-    def metadata(self, key, value):
-        if key == srd.SRD_CONF_SAMPLERATE:
-            self.samplerate = value
-
     def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
+        self.bit_annotations = self.options['bit_annotations']
+        self.compile_timing()
 
     def reset(self):
-        self.state = 'START'
+        self.state = 'IDLE'
+        self.pulse_start = None
+        self.preamble = deque(maxlen=4)
 
     def decode(self):
         while True:
-            if self.state == 'START':
+            if self.state == 'IDLE':
+                self.decode_idle()
+            elif self.state == 'START':
                 self.decode_start()
             elif self.state == 'DATA':
                 self.decode_data()
             else:
                 raise Exception(f"Unexpected state {self.state}")
 
+    def decode_idle(self):
+        self.pulse_start = self.skip_idle()
+        self.state = 'START'
+
+    def skip_idle(self):
+        """
+        Fast-forwards over idle line and glitches shorter than an ON pulse,
+        one combined wait per glitch instead of decoding each of them.
+
+        :return sample number at which a plausible ON pulse starts
+        """
+        while True:
+            self.wait([{0: 'h'}])
+            start = self.samplenum
+            self.wait([{0: 'f'}, {'skip': self.on_min - 1}])
+            if not self.matched[0]:
+                return start
+
     def decode_start(self):
-        ps = self.require_n_pulses(4)
-        if ps:
-          if all(val == 1 for val in map(lambda x: x[0], ps)):
-            fs = ps[0][1]
-            es = ps[-1][2]
-            self.put(fs, es, self.out_ann, [1, ['SOF']])
-            self.state = 'DATA'
-          else:
-            self.reset()
+        """
+        Slides a 4 pulse window over the pulse stream until it holds a preamble,
+        a pulse that does not decode breaks the stream and empties the window.
+        """
+        p = self.try_decode_pulse()
+        if p:
+            self.put_bit(p)
+            self.preamble.append(p)
+            if len(self.preamble) == 4 and all(x[0] == 1 for x in self.preamble):
+                self.put(self.preamble[0][1], p[2], self.out_ann, ANN.sof)
+                self.frame_pulses = list(self.preamble)
+                self.preamble.clear()
+                self.state = 'DATA'
         else:
             self.reset()
 
     def decode_data(self):
-        b0 = self.decode_byte()
-        b1 = self.decode_byte()
-        b2 = self.decode_byte()
-        b3 = self.decode_byte()
-
-        if b0 and b1 and b2 and b3:
-            self.decode_payload(b0, b1, b2, b3)
-
+        """
+        Decodes the 4 payload bytes, a byte that does not decode ends the
+        frame right away so that the pulses after it can sync again.
+        """
+        payload = []
+        while len(payload) < 4:
+            b = self.decode_byte()
+            if not b:
+                break
+            payload.append(b)
+
+        if len(payload) == 4:
+            self.decode_payload(ANN, self.seen, payload)
+
+        if self.bit_annotations == 'coalesced':
+            self.put_frame_bits()
         self.reset()
 
-    def decode_payload(self, b0i, b1i, b2i, b3i):
-        (b0, b0s, b0e) = b0i
-        (b1, b1s, b1e) = b1i
-        (b2, b2s, b2e) = b2i
-        (b3, b3s, b3e) = b3i
-
-        ch = b0 & 0b11
-        bat_ok = b0 & 0b1000
-        bat_str = "low"
-        if bat_ok:
-            bat_str = "ok"
-
-        self.put(b0s, b0e, self.out_ann, [2, [f"ch{ch} bat{bat_str}"]])
-
-        t = float(((b1 & 0xF) << 4) | ((b2 >> 4) & 0xF)) / 10.0
-        self.put(b1s, b2e, self.out_ann, [2, [f"T{t}C"]])
-
-        rh = b3
-        self.put(b3s, b3e, self.out_ann, [2, [f"RH{rh}%"]])
+    def put_bit(self, p):
+        """
+        Annotates a single bit, or collects the bits of a frame
+        for put_frame_bits() in coalesced mode.
+        """
+        if self.bit_annotations == 'on':
+            (b, s, e) = p
+            self.put(s, e, self.out_ann, ANN.bits[b])
+        elif self.bit_annotations == 'coalesced' and self.state == 'DATA':
+            self.frame_pulses.append(p)
 
+    def put_frame_bits(self):
+        ps = self.frame_pulses
+        if ps:
+            bits = ''.join('%d' % x[0] for x in ps)
+            self.put(ps[0][1], ps[-1][2], self.out_ann, [ANN.frame_bits, [bits]])
+        self.frame_pulses = []
 
     def decode_byte(self):
         ps = self.require_n_pulses(8)
@@ -121,7 +166,7 @@ class Decoder(srd.Decoder):
                 b = b + (bit << i)
                 i = i - 1
 
-            self.put(fs, es, self.out_ann, [1, ['%d' % b]])
+            self.put(fs, es, self.out_ann, ANN.bytes[b])
             return (b, fs, es)
         else:
             self.reset()
@@ -132,8 +177,7 @@ class Decoder(srd.Decoder):
         result = []
 
         while p and i < n:
-            (b, s, e) = p
-            self.put(s, e, self.out_ann, [0, ['%d' % b]])
+            self.put_bit(p)
             result.append(p)
             i = i+1
             if i > 0 and i < n:
@@ -145,30 +189,22 @@ class Decoder(srd.Decoder):
             self.reset()
 
     def try_decode_pulse(self):
-        self.wait([{0: 'h'}])
-        self.wait([{0: 'n'}])
-        start = self.samplenum
+        if self.pulse_start is None:
+            self.wait([{0: 'h'}])
+            self.wait([{0: 'n'}])
+            start = self.samplenum
+        else:
+            # ON pulse already found by skip_idle()
+            start = self.pulse_start
+            self.pulse_start = None
         self.wait([{0: 'f'}])
         fall = self.samplenum # On pulse, same lenghts
-        self.wait([{0: 'r'}])
+        # a pause longer than long_max ends the pulse without waiting for
+        # the next one, which may be a transmission later
+        self.wait([{0: 'r'}, {'skip': self.long_max + 1}])
+        if not self.matched[0]:
+            return None
         self.samplenum = self.samplenum - 1
         end_of_pause = self.samplenum # pause after falling edge, long or short
 
-        on_pulse_millis = self.duration_millis(start, fall)
-
-        # expect same-ish ON pulse
-        if math.fabs(on_pulse_millis - 0.5) > 0.2:
-            return None
-
-        pause_millis = self.duration_millis(fall, end_of_pause)
-
-        # expect either short or a long pause
-        if math.fabs(pause_millis - 2.0) < 0.2:
-            return (1, start, end_of_pause)
-        elif math.fabs(pause_millis - 1.0) < 0.2:
-            return (0, start, end_of_pause)
-        else:
-            return None
-
-    def duration_millis(self, ss, es):
-        return 1000 * (es - ss) / self.samplerate
+        return self.classify(start, fall, end_of_pause)
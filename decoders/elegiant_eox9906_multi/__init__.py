@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+
+'''
+Pulse interval decoder for several Elegiant EOX-9906 weather station
+receivers captured on separate channels, decoded in one pass.
+'''
+
+from .pd import Decoder
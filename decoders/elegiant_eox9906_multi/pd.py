@@ -0,0 +1,161 @@
+import sigrokdecode as srd
+from collections import deque
+from itertools import compress
+from eox9906_common import (OPTIONS, ANN_BITS, ANN_FIELDS, ANN_DECODED, ANN_REPEAT,
+                            NUM_CLASSES, Annotations, FrameDecoder)
+
+MAX_CHANNELS = 16
+
+class Receiver:
+    """
+    Pulse and frame state of one OOK channel, advanced edge by edge.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.ann = Annotations(index)
+        # (first sample, copies) by payload
+        self.seen = {}
+        self.reset()
+
+    def reset(self):
+        self.state = 'START'
+        self.rise = None
+        self.fall = None
+        self.preamble = deque(maxlen=4)
+        self.frame = []
+
+class Decoder(FrameDecoder, srd.Decoder):
+    """
+    Elegiant EOX-9906 weather station transmitters on up to 16 channels.
+
+    Same frames as the elegiant-eox9906 decoder, one receiver (OOK pulses)
+    per channel. A single wait() on the edges of all connected channels
+    drives a state machine per channel, so the capture is walked only once
+    however many receivers it holds.
+
+    OUTPUT_PYTHON: ['READING', (channel, battery ok, temperature C, humidity %), receiver]
+    and ['REPEAT', (channel, copies so far), receiver], receiver is the OOK channel index.
+    """
+    api_version = 3
+    id = 'elegiant-eox9906-multi'
+    name = 'elegiant-EOX-9906-multi'
+    longname = 'Elegiant EOX 9906 (multiple receivers)'
+    desc = 'Elegiant EOX 9906 decoder for several OOK channels.'
+    tags = ['Embedded/industrial']
+    license = 'gplv2+'
+    inputs = ['logic']
+    outputs = ['eox9906']
+    channels = (
+        {'id': 'ook0', 'name': 'OOK0', 'desc': 'OnOffKey pulses, receiver 0'},
+    )
+    optional_channels = tuple(
+        {'id': f'ook{n}', 'name': f'OOK{n}', 'desc': f'OnOffKey pulses, receiver {n}'}
+        for n in range(1, MAX_CHANNELS))
+    annotations = tuple(
+        a for n in range(MAX_CHANNELS) for a in (
+            (f'bits{n}', f'EOX 9906 bits, receiver {n}'),
+            (f'fields{n}', f'EOX 9906 bit fields, receiver {n}'),
+            (f'decoded{n}', f'EOX 9906 decoded values, receiver {n}'),
+            (f'repeat{n}', f'EOX 9906 repeated frames, receiver {n}'),
+        ))
+    annotation_rows = tuple(
+        r for n in range(MAX_CHANNELS) for r in (
+            (f'bits{n}', f'Bits {n}', (n * NUM_CLASSES + ANN_BITS,)),
+            (f'bit_fields{n}', f'Bit fields {n}', (n * NUM_CLASSES + ANN_FIELDS,)),
+            (f'decoded{n}', f'Decoded {n}',
+                (n * NUM_CLASSES + ANN_DECODED, n * NUM_CLASSES + ANN_REPEAT)),
+        ))
+    options = OPTIONS
+
+    def __init__(self, **kwargs):
+        self.samplerate = None
+        self.receivers = []
+
+    def start(self):
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+        self.out_python = self.register(srd.OUTPUT_PYTHON)
+        self.bit_annotations = self.options['bit_annotations']
+        self.compile_timing()
+        self.receivers = [Receiver(n) for n in range(MAX_CHANNELS) if self.has_channel(n)]
+
+    def decode(self):
+        edges = [{r.index: 'e'} for r in self.receivers]
+        while True:
+            # A pause ends at the next rising edge, or once it is longer than
+            # a long pause, so that a frame is complete without the next one.
+            falls = [r.fall for r in self.receivers if r.fall is not None]
+            conds = edges
+            if falls:
+                conds = edges + [{'skip': min(falls) + self.long_max + 1 - self.samplenum}]
+            pins = self.wait(conds)
+
+            s = self.samplenum
+            for r in compress(self.receivers, self.matched):
+                self.edge(r, s, pins[r.index])
+            if len(conds) > len(edges) and self.matched[-1]:
+                for r in self.receivers:
+                    if r.fall is not None and s > r.fall + self.long_max:
+                        r.rise = r.fall = None
+                        self.pulse(r, None)
+
+    def edge(self, r, s, value):
+        if value:
+            if r.fall is not None:
+                self.pulse(r, self.classify(r.rise, r.fall, s - 1))
+            r.rise = s
+            r.fall = None
+        elif r.rise is not None:
+            r.fall = s
+
+    def pulse(self, r, p):
+        """
+        Feeds a decoded pulse (or None for a pulse that does not decode)
+        into a receiver's frame state machine.
+        """
+        if p is None:
+            if r.state == 'DATA' and self.bit_annotations == 'coalesced':
+                self.put_frame_bits(r)
+            r.reset()
+        elif r.state == 'START':
+            self.put_bit(r, p)
+            r.preamble.append(p)
+            if len(r.preamble) == 4 and all(x[0] == 1 for x in r.preamble):
+                self.put(r.preamble[0][1], p[2], self.out_ann, r.ann.sof)
+                r.frame = list(r.preamble)
+                r.preamble.clear()
+                r.state = 'DATA'
+        else:
+            r.frame.append(p)
+            self.put_bit(r, p)
+            data = r.frame[4:]
+            if len(data) % 8 == 0:
+                self.put_byte(r, data[-8:])
+            if len(data) == 32:
+                self.decode_payload(r.ann, r.seen,
+                                    [(self.byte_value(ps), ps[0][1], ps[-1][2])
+                                     for ps in (data[i:i + 8] for i in range(0, 32, 8))],
+                                    r.index)
+                if self.bit_annotations == 'coalesced':
+                    self.put_frame_bits(r)
+                r.reset()
+
+    def put_bit(self, r, p):
+        if self.bit_annotations == 'on':
+            (b, s, e) = p
+            self.put(s, e, self.out_ann, r.ann.bits[b])
+
+    def put_frame_bits(self, r):
+        ps = r.frame
+        if ps:
+            bits = ''.join('%d' % x[0] for x in ps)
+            self.put(ps[0][1], ps[-1][2], self.out_ann, [r.ann.frame_bits, [bits]])
+
+    def byte_value(self, ps):
+        b = 0
+        for p in ps:
+            b = (b << 1) | p[0]
+        return b
+
+    def put_byte(self, r, ps):
+        self.put(ps[0][1], ps[-1][2], self.out_ann, r.ann.bytes[self.byte_value(ps)])
@@ -0,0 +1,8 @@
+'''
+Timing, payload and repeat handling shared by the Elegiant EOX-9906
+decoders, not a decoder itself.
+
+Not part of a "common" package, libsigrokdecode's own one would shadow it.
+'''
+
+from .mod import *
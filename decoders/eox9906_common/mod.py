@@ -0,0 +1,139 @@
+import sigrokdecode as srd
+import math
+
+__all__ = ['OPTIONS', 'ANN_BITS', 'ANN_FIELDS', 'ANN_DECODED', 'ANN_REPEAT', 'NUM_CLASSES',
+           'Annotations', 'FrameDecoder']
+
+OPTIONS = (
+    {'id': 'bit_annotations', 'desc': 'Bit annotations',
+        'default': 'on', 'values': ('on', 'off', 'coalesced')},
+    {'id': 'pulse_ms', 'desc': 'ON pulse (ms)', 'default': 0.5},
+    {'id': 'pulse_tolerance_ms', 'desc': 'ON pulse tolerance (ms)', 'default': 0.2},
+    {'id': 'short_ms', 'desc': 'Short pause (ms)', 'default': 1.0},
+    {'id': 'long_ms', 'desc': 'Long pause (ms)', 'default': 2.0},
+    {'id': 'pause_tolerance_ms', 'desc': 'Pause tolerance (ms)', 'default': 0.2},
+    {'id': 'repeat_window_ms', 'desc': 'Repeat window (ms), 0 to decode every copy',
+        'default': 0.0},
+)
+
+# Annotation classes of a receiver, receiver n of the multi receiver
+# decoder uses n * NUM_CLASSES + class.
+ANN_BITS, ANN_FIELDS, ANN_DECODED, ANN_REPEAT = range(4)
+NUM_CLASSES = 4
+
+class Annotations:
+    """
+    Annotation data of one receiver reused by every put(),
+    libsigrokdecode copies the strings and requires lists.
+    """
+
+    def __init__(self, receiver=0):
+        base = receiver * NUM_CLASSES
+        self.bits = tuple([base + ANN_BITS, ['%d' % b]] for b in range(2))
+        self.bytes = tuple([base + ANN_FIELDS, ['%d' % b]] for b in range(256))
+        self.sof = [base + ANN_FIELDS, ['SOF']]
+        self.frame_bits = base + ANN_BITS
+        self.decoded = base + ANN_DECODED
+        self.repeat = base + ANN_REPEAT
+
+class FrameDecoder:
+    """
+    Mixed into the EOX-9906 Decoder classes: converts the timing options
+    into sample counts, classifies pulses and puts the payload of a frame.
+    """
+
+    def metadata(self, key, value):
+        if key == srd.SRD_CONF_SAMPLERATE:
+            self.samplerate = value
+            self.compile_timing()
+
+    def compile_timing(self):
+        """
+        Converts the timing options into sample count windows,
+        (min, max) inclusive.
+        """
+        if self.samplerate is None:
+            return
+        o = self.options
+        self.on_min, self.on_max = self.window_samples(
+            o['pulse_ms'], o['pulse_tolerance_ms'], True)
+        self.long_min, self.long_max = self.window_samples(
+            o['long_ms'], o['pause_tolerance_ms'], False)
+        self.short_min, self.short_max = self.window_samples(
+            o['short_ms'], o['pause_tolerance_ms'], False)
+        self.repeat_window = round(o['repeat_window_ms'] * self.samplerate / 1000)
+
+    def window_samples(self, millis, tolerance, inclusive):
+        """
+        Converts millis +/- tolerance into a range of sample counts.
+        """
+        lo = (millis - tolerance) * self.samplerate / 1000
+        hi = (millis + tolerance) * self.samplerate / 1000
+        if inclusive:
+            return (max(1, math.ceil(lo)), math.floor(hi))
+        else:
+            return (max(1, math.floor(lo) + 1), math.ceil(hi) - 1)
+
+    def classify(self, start, fall, end_of_pause):
+        """
+        :return (bit, start, end) of a pulse and the pause after it, None if neither fits
+        """
+        # expect same-ish ON pulse
+        if not (self.on_min <= fall - start <= self.on_max):
+            return None
+
+        pause = end_of_pause - fall
+
+        # expect either short or a long pause
+        if self.long_min <= pause <= self.long_max:
+            return (1, start, end_of_pause)
+        elif self.short_min <= pause <= self.short_max:
+            return (0, start, end_of_pause)
+        else:
+            return None
+
+    def decode_payload(self, ann, seen, payload, *extra):
+        """
+        Puts the annotations and python output of a frame,
+        extra is appended to the python output.
+
+        :param ann Annotations of the receiver
+        :param seen earlier payloads of the receiver, see count_repeat()
+        :param payload 4 (byte, ss, es)
+        """
+        ((b0, b0s, b0e), (b1, b1s, b1e), (b2, b2s, b2e), (b3, b3s, b3e)) = payload
+
+        ch = b0 & 0b11
+        n = self.count_repeat(seen, (b0, b1, b2, b3), b0s)
+        if n:
+            self.put(b0s, b3e, self.out_ann, [ann.repeat, [f"ch{ch} repeat {n}", f"R{n}"]])
+            self.put(b0s, b3e, self.out_python, ['REPEAT', (ch, n), *extra])
+            return
+
+        bat_ok = b0 & 0b1000
+        bat_str = "ok" if bat_ok else "low"
+        self.put(b0s, b0e, self.out_ann, [ann.decoded, [f"ch{ch} bat{bat_str}"]])
+
+        t = float(((b1 & 0xF) << 4) | ((b2 >> 4) & 0xF)) / 10.0
+        self.put(b1s, b2e, self.out_ann, [ann.decoded, [f"T{t}C"]])
+
+        rh = b3
+        self.put(b3s, b3e, self.out_ann, [ann.decoded, [f"RH{rh}%"]])
+
+        self.put(b0s, b3e, self.out_python, ['READING', (ch, bool(bat_ok), t, rh), *extra])
+
+    def count_repeat(self, seen, payload, ss):
+        """
+        Counts a frame starting at ss against the earlier copies of its payload
+        (which includes the channel) within the repeat window.
+
+        :param seen (first sample, copies) by payload, updated
+        :return number of copies before this one, 0 for a new reading
+        """
+        if not self.repeat_window:
+            return 0
+        for k in [k for k, (first, n) in seen.items() if ss - first >= self.repeat_window]:
+            del seen[k]
+        first, n = seen.get(payload, (ss, 0))
+        seen[payload] = (first, n + 1)
+        return n
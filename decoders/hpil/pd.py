@@ -1,6 +1,62 @@
 import sigrokdecode as srd
 import math
-from functools import reduce
+
+# Plausible HP-IL timing in microseconds,
+# nominal pulse halves are 1us, captured ones 0.7-0.9us.
+HALF_MIN_US = 0.3 # each half of a pulse
+HALF_MAX_US = 2.0
+GAP_MAX_US = 1.0 # between pulse halves and between the 2 start pulses
+PAUSE_MAX_US = 5.0 # between the bits of a frame, after the pause skip
+
+# Annotation data reused by every put(),
+# libsigrokdecode copies the strings and requires lists.
+ANN_BITS = tuple([0, ['%d' % b]] for b in range(2))
+ANN_PAYLOAD = tuple([3, ["%d %s" % (p, ascii(chr(p)))]] for p in range(256))
+ANN_DATA = [1, ["Data", "D"]]
+ANN_IDENTITY = [1, ["Identity", "Ident", "Id"]]
+ANN_READY = [1, ["Command ready", "Ready", "Rd"]]
+ANN_EOR = [2, ["End of record", "EOR", "E"]]
+ANN_SR = [2, ["Service request", "SR", "S"]]
+
+def message_class(c):
+    """
+    Message class mnemonic of the control bits C2 C1 C0.
+    """
+    if c < 0b100:
+        return 'DAB'
+    return ('CMD', 'RDY', 'IDY', 'IDY')[c & 0b11]
+
+def control_annotations(c):
+    """
+    Message class and control flag annotations of the control bits C2 C1 C0.
+
+    :return (class annotation or None, tuple of flag annotations)
+    """
+    c2, c1, c0 = (c >> 2) & 1, (c >> 1) & 1, c & 1
+    if c2 == 0:
+        return (ANN_DATA, ((ANN_EOR,) if c1 else ()) + ((ANN_SR,) if c0 else ()))
+    elif c1 == 1:
+        return (ANN_IDENTITY, (ANN_SR,) if c0 else ())
+    elif c0 == 1:
+        return (ANN_READY, ())
+    else:
+        return (None, ())
+
+def frame(w):
+    """
+    Annotations and outputs of an 11-bit frame.
+
+    :return (class annotation, flag annotations, payload annotation,
+             OUTPUT_PYTHON data, OUTPUT_BINARY data)
+    """
+    c, p = w >> 8, w & 0xFF
+    return control_annotations(c) + (
+        ANN_PAYLOAD[p],
+        ['FRAME', (message_class(c), c, p)],
+        [1, w.to_bytes(2, 'big')],
+    )
+
+FRAMES = tuple(frame(w) for w in range(2048))
 
 class Decoder(srd.Decoder):
     """
@@ -12,6 +68,19 @@ class Decoder(srd.Decoder):
     (2 LM393 comparators in the inverting configuration, i.e. "inactive high",
     instead of the shmiddt triggers in the orginal circuit)
     and represent >0 and <0 parts of a single pulse.
+
+    Complete frames are sent to stacked decoders as
+    ['FRAME', (class, control bits, payload)] with class one of
+    'DAB', 'CMD', 'RDY', 'IDY', and as 2 bytes per frame on the binary output.
+
+    Data frame payloads are reassembled into records,
+    each record is put as a whole once its End-of-record frame arrives.
+    A frame that does not decode completely, a rejected start pulse pair,
+    or any other frame before End-of-record, drops the record.
+
+    The pulse width is tracked across frames (EWMA), start pulses that
+    deviate more than start_mismatch % from it are rejected, the tracked width in samples
+    is put on the meta output whenever it changes.
     """
 
     api_version = 3
@@ -29,6 +98,8 @@ class Decoder(srd.Decoder):
     )
     binary = (
         ('bits', 'HP-IL bits'),
+        ('frames', 'HP-IL frames, 11 bits big endian'),
+        ('records', 'HP-IL data records'),
     )
     annotations = (
         ('bits', 'HP-IL bits'),
@@ -41,24 +112,53 @@ class Decoder(srd.Decoder):
         ('msg_class', 'Class', (1,3,)),
         ('msg_frame', 'Frame', (2,)),
     )
+    options = (
+        {'id': 'bit_annotations', 'desc': 'Bit annotations',
+            'default': 'on', 'values': ('on', 'off', 'coalesced')},
+        {'id': 'start_mismatch', 'desc': 'Start pulse width mismatch (%)', 'default': 15.0},
+        {'id': 'pause_factor', 'desc': 'Pause to skip (x pulse width)', 'default': 0.85},
+    )
 
     def __init__(self, **kwargs):
+        self.samplerate = None
+        self.half_min = 0
+        self.half_max = self.gap_max = self.pause_max = None
         self.reset()
 
     def metadata(self, key, value):
-        None
+        if key == srd.SRD_CONF_SAMPLERATE:
+            self.samplerate = value
+            self.half_min = self.us_samples(HALF_MIN_US)
+            self.half_max = self.us_samples(HALF_MAX_US)
+            self.gap_max = self.us_samples(GAP_MAX_US)
+            self.pause_max = self.us_samples(PAUSE_MAX_US)
+
+    def us_samples(self, us):
+        return max(1, math.floor(us * self.samplerate / 1000000))
 
     def start(self):
         self.out_python = self.register(srd.OUTPUT_PYTHON)
         self.out_ann = self.register(srd.OUTPUT_ANN)
         self.out_binary = self.register(srd.OUTPUT_BINARY)
+        self.out_meta = self.register(srd.OUTPUT_META,
+            meta=(int, 'Pulse width', 'Tracked HP-IL pulse width in samples'))
+        self.bit_annotations = self.options['bit_annotations']
+        self.start_mismatch = self.options['start_mismatch']
+        self.pause_factor = self.options['pause_factor']
 
     def reset(self):
         self.state = 'START'
         self.ss = self.es = None
         self.pulse_width = None
+        self.pause_skip = None
+        self.reported_width = None
+        self.rejected_starts = 0
         self.num_decoded_bits = None
         self.message = []
+        self.word = 0
+        self.record = bytearray(256)
+        self.record_len = 0
+        self.record_ss = None
 
     def putx(self, data):
         self.put(self.ss, self.es, self.out_ann, data)
@@ -69,6 +169,10 @@ class Decoder(srd.Decoder):
     def putb(self, data):
         self.put(self.ss, self.es, self.out_binary, data)
 
+    def put_bit(self, b):
+        if self.bit_annotations == 'on':
+            self.putx(ANN_BITS[b])
+
     def message_bit(self, b):
         """
         Save a single message bit.
@@ -76,47 +180,71 @@ class Decoder(srd.Decoder):
         """
         self.message.append((self.ss, self.es, b))
 
-    def one_pulse(self):
+    def wait_limited(self, cond, limit):
         """
-        Reads a single pulse.
+        Waits for a condition for at most limit samples,
+        no limit when the samplerate is unknown.
+
+        :return False if the limit was hit first
+        """
+        if limit is None:
+            self.wait([cond])
+            return True
+        self.wait([cond, {'skip': limit}])
+        return self.matched[0]
+
+    def one_pulse(self, timeout=None):
+        """
+        Reads a single pulse, starting within timeout samples if given.
+        With a known samplerate pulses with implausible timing are
+        given up on as soon as that is evident.
 
         :return (start, end, -1) when a negative pulse is detected,
                 (start, end, +1) when a positive pulse is detected,
                 (start, end, None) otherwise
         """
-        hpil0, hpil1 = self.wait([{0: 'h', 1: 'f'}, {1: 'h', 0: 'f'}])
+        conds = [{0: 'h', 1: 'f'}, {1: 'h', 0: 'f'}]
+        if timeout is not None:
+            conds.append({'skip': timeout})
+        hpil0, hpil1 = self.wait(conds)
 
         start = self.samplenum
 
-        if hpil0 == 0:
-            self.wait([{0: 'r', 1: 'h'}])
-            self.wait([{0: 'h', 1: 'f'}])
-            self.wait([{0: 'h', 1: 'r'}])
-
-            return (start, self.samplenum, -1)
+        if not (self.matched[0] or self.matched[1]):
+            return (start, self.samplenum, None)
+        elif hpil0 == 0:
+            a, b, polarity = 0, 1, -1
+        elif hpil1 == 0:
+            a, b, polarity = 1, 0, 1
+        else:
+            return (start, self.samplenum, None)
 
-        elif hpil1 ==0:
-            self.wait([{1: 'r', 0: 'h'}])
-            self.wait([{1: 'h', 0: 'f'}])
-            self.wait([{1: 'h', 0: 'r'}])
+        # first half, gap, second half
+        if (not self.wait_limited({a: 'r', b: 'h'}, self.half_max) or
+                self.samplenum - start < self.half_min):
+            return (start, self.samplenum, None)
 
-            return (start, self.samplenum, 1)
+        if not self.wait_limited({a: 'h', b: 'f'}, self.gap_max):
+            return (start, self.samplenum, None)
 
-        else:
+        half = self.samplenum
+        if (not self.wait_limited({a: 'h', b: 'r'}, self.half_max) or
+                self.samplenum - half < self.half_min):
             return (start, self.samplenum, None)
 
+        return (start, self.samplenum, polarity)
+
     def one_pause(self):
         """
         Reads a single pause.
-        Expects it to roughly match self.pulse_width
+        Expects it to roughly match the tracked pulse width
 
         :return (start, end, Bool)
         """
 
         start = self.samplenum
         # Wait for either pin falling while trying to skip approx "pause duration" number of samples
-        to_skip = math.floor(self.pulse_width * 0.85)
-        pins = self.wait([{'skip': to_skip}, {1: 'f'}, {0: 'f'}])
+        pins = self.wait([{'skip': self.pause_skip}, {1: 'f'}, {0: 'f'}])
 
         if self.matched[0]:
             # this was an actual pause, no other pin changes
@@ -134,7 +262,7 @@ class Decoder(srd.Decoder):
         """
 
         s, e, p = self.one_pause()
-        ps, pe, pp = self.one_pulse()
+        ps, pe, pp = self.one_pulse(self.pause_max)
 
         if p and (not (pp is None)):
             return (s, pe, 1 if pp > 0 else 0)
@@ -142,31 +270,68 @@ class Decoder(srd.Decoder):
             return (s, pe, None)
 
 
+    def track_pulse_width(self, width):
+        """
+        Folds a start pulse width into the running estimate.
+        """
+        if self.pulse_width is None:
+            self.pulse_width = width
+        else:
+            self.pulse_width += (width - self.pulse_width) / 8
+        self.pause_skip = math.floor(self.pulse_width * self.pause_factor)
+
+        w = round(self.pulse_width)
+        if w != self.reported_width:
+            self.reported_width = w
+            self.put(self.ss, self.es, self.out_meta, w)
+
+    def width_matches(self, w, reference):
+        return abs(w - reference) * 100 <= reference * self.start_mismatch
+
     def handle_start(self):
         self.message = []
 
         p0s, p0e, p0 = self.one_pulse()
-        p1s, p1e, p1 = self.one_pulse()
+        p1s, p1e, p1 = self.one_pulse(self.gap_max)
 
         dp0 = p0e - p0s
         dp1 = p1e - p1s
 
-        dpdiff_percent = (abs(dp0 - dp1) * 100) / dp0
-
-        if ( (p0 is None) or (p1 is None) or # must have 2 in a row
-             (p0 != p1) or # Expect S0 or S1 pulse first
-             (dpdiff_percent > 15) # pulse timing shoudl be pretty close
-           ):
-           self.state = 'START'
-        else:
-            self.ss = p0s
-            self.es = p1e
-            self.pulse_width = dp0
-
-            self.state = 'DATA'
-            bit0 = 1 if p0 > 0 else 0
-            self.message_bit(bit0)
-            self.putx([0, ['%d' % bit0 ]])
+        if (p0 is None) or (p1 is None) or (p0 != p1): # Expect 2 S0 or S1 pulses in a row
+            self.state = 'START'
+            return
+
+        # pulse timing should be pretty close to the tracked width,
+        # one distorted start pulse is tolerated
+        widths = [w for w in (dp0, dp1)
+                  if self.pulse_width is not None and self.width_matches(w, self.pulse_width)]
+
+        if not widths:
+            # Without a usable estimate both pulses have to match each other,
+            # a few such pairs in a row replace an estimate that went stale.
+            if not self.width_matches(dp1, dp0):
+                self.state = 'START'
+                return
+            self.rejected_starts += 1
+            if self.pulse_width is not None and self.rejected_starts < 4:
+                # a frame is lost
+                self.record_len = 0
+                self.state = 'START'
+                return
+            self.pulse_width = None
+            widths = [dp0]
+
+        self.rejected_starts = 0
+        self.ss = p0s
+        self.es = p1e
+        for w in widths:
+            self.track_pulse_width(w)
+
+        self.state = 'DATA'
+        bit0 = 1 if p0 > 0 else 0
+        self.word = bit0
+        self.message_bit(bit0)
+        self.put_bit(bit0)
 
     def handle_data(self):
         self.state = 'START' # go back to start after this
@@ -180,31 +345,57 @@ class Decoder(srd.Decoder):
                 decoded_data_bits += 1
                 self.ss = s
                 self.es = e
+                self.word = (self.word << 1) | b
                 self.message_bit(b)
-                self.putx([0, ['%d' % b ]])
+                self.put_bit(b)
+
+        if self.bit_annotations == 'coalesced':
+            bits = ''.join('%d' % m[2] for m in self.message)
+            self.put(self.message[0][0], self.message[-1][1], self.out_ann, [0, [bits]])
 
         if decoded_data_bits > 2:
+            # pad a partial frame, control bits are all that is looked at then
+            cls, flags, payload, record, packed = FRAMES[self.word << (10 - decoded_data_bits)]
             (c2s, c2e, c2), (c1s, c1e, c1), (c0s, c0e, c0) = self.message[0:3]
-            if c2 == 0:
-                self.put(c2s, c0e, self.out_ann, [1, ["Data", "D"]])
-                if c1 == 1:
-                    self.put(c1s, c1e, self.out_ann, [2, ["End of record", "EOR", "E"]])
-                if c0 == 1:
-                    self.put(c1s, c1e, self.out_ann, [2, ["Service request", "SR", "S"]])
-            elif c1 == 1:
-                self.put(c2s, c0e, self.out_ann, [1, ["Identity", "Ident", "Id"]])
-                if c0 == 1:
-                    self.put(c1s, c1e, self.out_ann, [2, ["Service request", "SR", "S"]])
-            elif c0 == 1:
-                self.put(c2s, c0e, self.out_ann, [1, ["Command ready", "Ready", "Rd"]])
+            if cls:
+                self.put(c2s, c0e, self.out_ann, cls)
+            for f in flags:
+                self.put(c1s, c1e, self.out_ann, f)
 
         if decoded_data_bits == 10:
-            payload = self.message[3:]
-            ps = payload[0][0]
-            pe = payload[7][1]
-            pbits = list(map(lambda s: s[2], payload))
-            p = reduce(lambda a, b: (a << 1) | b, pbits)
-            self.put(ps, pe, self.out_ann, [3, ["%d %s" % (p, ascii(chr(p)))]])
+            self.put(self.message[3][0], self.message[10][1], self.out_ann, payload)
+
+            self.ss = self.message[0][0]
+            self.es = self.message[10][1]
+            self.putp(record)
+            self.putb(packed)
+
+            if self.word < 0b100 << 8:
+                self.handle_record_byte(self.word & 0xFF, self.word & (0b010 << 8))
+            else:
+                # the transfer ended without End-of-record
+                self.record_len = 0
+        else:
+            # a damaged frame loses a byte, the record would come out incomplete
+            self.record_len = 0
+
+    def handle_record_byte(self, p, end_of_record):
+        """
+        Appends a data frame payload to the current record,
+        puts the record when the frame is flagged End-of-record.
+        """
+        if self.record_len == 0:
+            self.record_ss = self.ss
+        elif self.record_len == len(self.record):
+            self.record.extend(bytes(len(self.record)))
+
+        self.record[self.record_len] = p
+        self.record_len += 1
+
+        if end_of_record:
+            data = bytes(memoryview(self.record)[:self.record_len])
+            self.put(self.record_ss, self.es, self.out_binary, [2, data])
+            self.record_len = 0
 
 
     def decode(self):
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+'''
+HP-IL loop protocol decoder, stacked on top of the HP-IL decoder.
+'''
+
+from .pd import Decoder
@@ -0,0 +1,182 @@
+import sigrokdecode as srd
+
+# (mnemonic, description) of commands without an address
+COMMANDS = {
+    0x00: ('NUL', 'Null'),
+    0x01: ('GTL', 'Go to local'),
+    0x04: ('SDC', 'Selected device clear'),
+    0x05: ('PPD', 'Parallel poll disable'),
+    0x08: ('GET', 'Group execute trigger'),
+    0x0F: ('ELN', 'Enable listener not ready'),
+    0x10: ('NOP', 'No operation'),
+    0x11: ('LLO', 'Local lockout'),
+    0x14: ('DCL', 'Device clear'),
+    0x15: ('PPU', 'Parallel poll unconfigure'),
+    0x18: ('EAR', 'Enable asynchronous requests'),
+    0x3F: ('UNL', 'Unlisten'),
+    0x5F: ('UNT', 'Untalk'),
+    0x90: ('IFC', 'Interface clear'),
+    0x92: ('REN', 'Remote enable'),
+    0x93: ('NRE', 'Not remote enable'),
+    0x9A: ('AAU', 'Auto address unconfigure'),
+    0x9B: ('LPD', 'Loop power down'),
+}
+
+# (first, last, mnemonic, description) of commands carrying an address
+ADDRESSED_COMMANDS = (
+    (0x20, 0x3E, 'LAD', 'Listen address'),
+    (0x40, 0x5E, 'TAD', 'Talk address'),
+    (0x60, 0x7E, 'SAD', 'Secondary address'),
+    (0x80, 0x8F, 'PPE', 'Parallel poll enable'),
+    (0xA0, 0xBF, 'DDL', 'Device dependent listener'),
+    (0xC0, 0xDF, 'DDT', 'Device dependent talker'),
+)
+
+READY = {
+    0x00: ('RFC', 'Ready for command'),
+    0x40: ('ETO', 'End of transmission OK'),
+    0x41: ('ETE', 'End of transmission error'),
+    0x42: ('NRD', 'Not ready for data'),
+    0x60: ('SDA', 'Send data'),
+    0x61: ('SST', 'Send status'),
+    0x62: ('SDI', 'Send device ID'),
+    0x63: ('SAI', 'Send accessory ID'),
+    0x64: ('TCT', 'Take control'),
+}
+
+ADDRESSED_READY = (
+    (0x80, 0x9E, 'AAD', 'Auto address'),
+    (0xA0, 0xBE, 'AEP', 'Auto extended primary'),
+    (0xC0, 0xDE, 'AES', 'Auto extended secondary'),
+    (0xE0, 0xFE, 'AMP', 'Auto multiple primary'),
+)
+
+def message(ann_class, kind, plain, addressed, p):
+    """
+    Annotation, mnemonic and address of a CMD or RDY frame payload.
+    """
+    if p in plain:
+        m, desc = plain[p]
+        return ([ann_class, [desc, m]], m, None)
+    for first, last, m, desc in addressed:
+        if first <= p <= last:
+            a = p - first
+            return ([ann_class, [f"{desc} {a}", f"{m} {a}"]], m, a)
+    return ([ann_class, [f"Unknown {kind} 0x{p:02X}", f"{kind} 0x{p:02X}"]], None, None)
+
+# (annotation, mnemonic, address) by frame payload
+CMD_TABLE = tuple(message(0, 'command', COMMANDS, ADDRESSED_COMMANDS, p) for p in range(256))
+RDY_TABLE = tuple(message(1, 'ready', READY, ADDRESSED_READY, p) for p in range(256))
+
+ANN_IDY = [2, ["Identify", "IDY"]]
+ANN_IDY_SR = [2, ["Identify, service request", "IDY SR"]]
+
+class Decoder(srd.Decoder):
+    """
+    Decodes HP-IL loop messages from the frames of the HP-IL decoder.
+
+    Command and ready frames are looked up in precomputed tables,
+    the loop state (talker and listeners) is tracked as addressing
+    commands pass by, data frames up to an End-of-record flag
+    or the next other frame are summarized as one transfer.
+    """
+
+    api_version = 3
+    id = 'hpil-loop'
+    name = 'HP-IL loop'
+    longname = 'HP-IL loop protocol'
+    desc = 'HP-IL loop messages and addressing state.'
+    tags = ['Embedded/industrial']
+    license = 'gplv2+'
+    inputs = ['hpil']
+    outputs = []
+    annotations = (
+        ('command', 'HP-IL command'),
+        ('ready', 'HP-IL ready message'),
+        ('identify', 'HP-IL identify message'),
+        ('transfer', 'HP-IL data transfer'),
+        ('state', 'HP-IL loop state'),
+    )
+    annotation_rows = (
+        ('messages', 'Messages', (0, 1, 2)),
+        ('transfers', 'Transfers', (3,)),
+        ('state', 'Loop state', (4,)),
+    )
+
+    def __init__(self, **kwargs):
+        self.reset()
+
+    def reset(self):
+        self.talker = None
+        self.listeners = frozenset()
+        self.state_ss = None
+        self.transfer_ss = self.transfer_es = None
+        self.transfer_bytes = 0
+
+    def start(self):
+        self.out_ann = self.register(srd.OUTPUT_ANN)
+
+    def put_state(self, es):
+        if self.state_ss is not None:
+            t = '-' if self.talker is None else self.talker
+            l = ','.join(map(str, sorted(self.listeners))) or '-'
+            self.put(self.state_ss, es, self.out_ann,
+                     [4, [f"Talker {t}, listeners {l}", f"T{t} L{l}"]])
+        self.state_ss = es
+
+    def put_transfer(self):
+        if self.transfer_bytes:
+            t = '-' if self.talker is None else self.talker
+            l = ','.join(map(str, sorted(self.listeners))) or '-'
+            self.put(self.transfer_ss, self.transfer_es, self.out_ann,
+                     [3, [f"{self.transfer_bytes} bytes, {t} to {l}",
+                          f"{self.transfer_bytes}B"]])
+        self.transfer_bytes = 0
+
+    def handle_command(self, ss, m, a):
+        """
+        Tracks the addressing state, annotates the state that ends here.
+        """
+        talker, listeners = self.talker, self.listeners
+        if m == 'TAD':
+            talker = a
+        elif m == 'UNT':
+            talker = None
+        elif m == 'LAD':
+            listeners = listeners | {a}
+        elif m == 'UNL':
+            listeners = frozenset()
+        elif m == 'IFC':
+            talker, listeners = None, frozenset()
+
+        if talker != self.talker or listeners != self.listeners:
+            self.put_state(ss)
+            self.talker, self.listeners = talker, listeners
+
+    def decode(self, ss, es, data):
+        ptype, pdata = data
+        if ptype != 'FRAME':
+            return
+        cls, c, p = pdata
+
+        if cls == 'DAB':
+            if not self.transfer_bytes:
+                self.transfer_ss = ss
+            self.transfer_es = es
+            self.transfer_bytes += 1
+            # End of record
+            if c & 0b010:
+                self.put_transfer()
+            return
+
+        self.put_transfer()
+
+        if cls == 'CMD':
+            ann, m, a = CMD_TABLE[p]
+            self.put(ss, es, self.out_ann, ann)
+            self.handle_command(ss, m, a)
+        elif cls == 'RDY':
+            ann, m, a = RDY_TABLE[p]
+            self.put(ss, es, self.out_ann, ann)
+        else:
+            self.put(ss, es, self.out_ann, ANN_IDY_SR if c & 1 else ANN_IDY)
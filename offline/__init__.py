@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+
+'''
+Offline, in-process runner for the decoders in this repository.
+
+Provides a pure-Python stand-in for the libsigrokdecode "sigrokdecode"
+module so that decoders can be driven from plain Python.
+'''
+
+from .session import Session, load_decoder
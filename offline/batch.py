@@ -0,0 +1,242 @@
+'''
+Batch decoding of directories of captures into JSON Lines.
+
+    python -m offline.batch -P elegiant-eox9906 archive/eox -o eox.jsonl
+    python -m offline.batch -P 'hpil*=hpil' -P '*=elegiant-eox9906' archive
+
+Captures (.sr, .srzip) are decoded by a process pool, one capture per task.
+Workers write their rows to temporary files which are copied to the output
+as captures finish, at most two captures per worker are in flight, so memory
+does not grow with the number or size of captures.
+
+Every output row is a JSON object with the capture path and decoder id,
+"ss"/"es" sample numbers and either the annotation "class" and "values"
+or the decoder's "python" output, captures that fail get a single "error"
+row instead of their rows.
+
+With --cache the rows of each capture are kept in a ResultCache, unchanged
+captures decoded by an unchanged decoder with the same options are not
+decoded again.
+'''
+
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import srd
+from .capture import Capture
+from .edges import load_edges
+from .results import DEFAULT_DIR, DEFAULT_SIZE, ResultCache
+from .session import Session, load_decoder
+
+EXTENSIONS = ('.sr', '.srzip')
+
+def find_captures(paths):
+    """
+    Capture files among paths, directories are searched recursively.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def match_decoder(path, decoders):
+    """
+    First decoder id whose pattern matches the capture's file name.
+
+    :param decoders list of (glob pattern, decoder id)
+    """
+    name = os.path.basename(path)
+    for pattern, decoder_id in decoders:
+        if fnmatch.fnmatch(name, pattern):
+            return decoder_id
+    return None
+
+def known_options(decoder, options):
+    """
+    Picks the options the decoder has, options are shared by all decoders of a batch.
+    """
+    known = {o['id'] for o in getattr(decoder, 'options', ())}
+    return {k: v for k, v in (options or {}).items() if k in known}
+
+def decode_capture(path, decoder, write, options=None, annotations=None, edges=False):
+    """
+    Decodes a capture, calling write(row) for every output as it is put,
+    rows leave out the capture and decoder, see row_prefix().
+    """
+    classes = [a[0] for a in getattr(decoder, 'annotations', ())]
+
+    def on_ann(ss, es, data):
+        if annotations is None or classes[data[0]] in annotations:
+            write({'ss': ss, 'es': es, 'class': classes[data[0]], 'values': data[1]})
+
+    def on_python(ss, es, data):
+        write({'ss': ss, 'es': es, 'python': data})
+
+    if edges:
+        e = load_edges(path)
+        s = Session(decoder, samplerate=e.samplerate, options=options)
+        s.add_callback(srd.OUTPUT_ANN, on_ann)
+        s.add_callback(srd.OUTPUT_PYTHON, on_python)
+        s.run_transitions(*e.channels(s.bits), 0, e.length)
+    else:
+        capture = Capture(path)
+        s = Session(decoder, samplerate=capture.samplerate, options=options)
+        s.add_callback(srd.OUTPUT_ANN, on_ann)
+        s.add_callback(srd.OUTPUT_PYTHON, on_python)
+        s.run_chunks(capture.chunks())
+        capture.close()
+
+def row_prefix(path, decoder_id):
+    """
+    Start of the output rows of a capture, a row's JSON text without its
+    opening brace completes it.
+    """
+    return json.dumps({'capture': path, 'decoder': decoder_id})[:-1] + ', '
+
+def decode_to_file(path, decoder_id, tmp_dir, options=None, annotations=None, edges=False,
+                   cache_dir=None, cache_size=None):
+    """
+    Worker task, decodes a capture into a temporary JSON Lines file,
+    or copies its rows from the result cache in cache_dir.
+
+    :return (temporary file path, number of rows, whether the rows were cached)
+    """
+    decoder = load_decoder(decoder_id)
+    options = known_options(decoder, options)
+    prefix = row_prefix(path, decoder_id)
+    fd, out_path = tempfile.mkstemp(suffix='.jsonl', dir=tmp_dir)
+    n = 0
+    cached = None
+    with open(fd, 'w') as out:
+        def write(row):
+            nonlocal n
+            line = json.dumps(row, default=str)
+            out.write(prefix + line[1:] + '\n')
+            if cached is not None:
+                cached.write(line + '\n')
+            n += 1
+
+        try:
+            if cache_dir is None:
+                decode_capture(path, decoder, write, options, annotations, edges)
+                return (out_path, n, False)
+
+            cache = ResultCache(cache_dir, cache_size)
+            key = cache.key(path, decoder, options,
+                            sorted(annotations) if annotations is not None else None)
+            rows = cache.get(key)
+            if rows is not None:
+                for line in rows:
+                    out.write(prefix + line[1:])
+                    n += 1
+                return (out_path, n, True)
+            # a failed decode leaves no entry behind
+            with cache.put(key) as cached:
+                decode_capture(path, decoder, write, options, annotations, edges)
+            return (out_path, n, False)
+        except Exception as e:
+            # the rows of a capture that failed part way through are dropped
+            out.seek(0)
+            out.truncate()
+            out.write(prefix + json.dumps({'error': f'{type(e).__name__}: {e}'})[1:] + '\n')
+            return (out_path, -1, False)
+
+def decode_batch(captures, out, jobs=None, options=None, annotations=None, edges=False,
+                 cache=None):
+    """
+    Decodes (path, decoder id) pairs in a process pool, copying their rows
+    to the text file out as captures finish. Rows are taken from and added
+    to the ResultCache cache if given.
+
+    :return list of (path, number of rows, cached), -1 rows for failed captures
+    """
+    jobs = jobs or os.cpu_count()
+    captures = iter(captures)
+    results = []
+    cache_args = (cache.path, cache.max_size) if cache else (None, None)
+    with tempfile.TemporaryDirectory() as tmp_dir, ProcessPoolExecutor(jobs) as pool:
+        pending = {}
+
+        def submit():
+            for path, decoder_id in captures:
+                f = pool.submit(decode_to_file, path, decoder_id, tmp_dir,
+                                options, annotations, edges, *cache_args)
+                pending[f] = path
+                return True
+            return False
+
+        while len(pending) < 2 * jobs and submit():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                path = pending.pop(f)
+                out_path, n, cached = f.result()
+                with open(out_path) as rows:
+                    shutil.copyfileobj(rows, out)
+                out.flush()
+                os.remove(out_path)
+                results.append((path, n, cached))
+                if cache and not cached:
+                    cache.evict()
+                submit()
+    if cache:
+        cache.evict()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='capture files or directories')
+    parser.add_argument('-P', '--decoder', action='append', required=True,
+                        metavar='[GLOB=]ID', help='decoder id, for file names matching GLOB')
+    parser.add_argument('-O', '--option', action='append', default=[], metavar='ID=VALUE')
+    parser.add_argument('-A', '--annotation', action='append', metavar='ID',
+                        help='annotation classes to write, default all')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes')
+    parser.add_argument('-o', '--output', help='JSON Lines file, default stdout')
+    parser.add_argument('--edges', action='store_true',
+                        help='decode from (and fill) the transition caches')
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_DIR, metavar='DIR',
+                        help=f'reuse the rows of unchanged captures, default {DEFAULT_DIR}')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_SIZE >> 20, metavar='MIB',
+                        help='result cache size limit')
+    args = parser.parse_args(argv)
+
+    decoders = [d.split('=', 1) if '=' in d else ('*', d) for d in args.decoder]
+    for pattern, decoder_id in decoders:
+        load_decoder(decoder_id)
+
+    captures = []
+    for path in find_captures(args.paths):
+        decoder_id = match_decoder(path, decoders)
+        if decoder_id is None:
+            print(f"{path}: no decoder matches, skipped", file=sys.stderr)
+        else:
+            captures.append((path, decoder_id))
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    results = decode_batch(captures, out, args.jobs,
+                           dict(o.split('=', 1) for o in args.option),
+                           set(args.annotation) if args.annotation else None, args.edges,
+                           ResultCache(args.cache, args.cache_size << 20) if args.cache else None)
+    if args.output:
+        out.close()
+
+    failed = [path for path, n, cached in results if n < 0]
+    for path in failed:
+        print(f"{path}: failed", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
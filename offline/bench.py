@@ -0,0 +1,190 @@
+'''
+Decoder throughput benchmark over the captures in "example".
+
+    python -m offline.bench -n 3 -o bench.json
+    python -m offline.bench --compare bench.json
+    python -m offline.bench -O bit_annotations=off
+    python -m offline.bench --mmap
+    python -m offline.bench --edges
+'''
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from . import srd
+from .capture import Capture
+from .edges import load_edges
+from .engine import EdgeEngine
+from .session import Session, load_decoder
+
+EXAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example')
+
+CASES = (
+    ('hpil.sr', 'hpil'),
+    ('elegiant.srzip', 'elegiant-eox9906'),
+)
+
+# Annotations that mark one decoded frame, per decoder id.
+FRAMES = {
+    'hpil': lambda data: data[0] == 1,
+    'elegiant-eox9906': lambda data: data[0] == 1 and data[1][0] == 'SOF',
+}
+
+def replay(path, decoder_id, options=None, mapped=False, edges=False):
+    """
+    Decodes a capture once, reading the samples from the memory-mapped
+    cache file if mapped is set, or only its transitions from the
+    transition cache if edges is set.
+
+    :return (number of samples, number of annotations, number of frames)
+    """
+    is_frame = FRAMES.get(decoder_id, lambda data: False)
+    counts = [0, 0]
+
+    def on_ann(ss, es, data):
+        counts[0] += 1
+        if is_frame(data):
+            counts[1] += 1
+
+    if edges:
+        e = load_edges(path)
+        s = Session(decoder_id, samplerate=e.samplerate, options=options)
+        s.add_callback(srd.OUTPUT_ANN, on_ann)
+        s.run_transitions(*e.channels(s.bits), 0, e.length)
+    else:
+        capture = Capture(path)
+        s = Session(decoder_id, samplerate=capture.samplerate, options=options)
+        s.add_callback(srd.OUTPUT_ANN, on_ann)
+        s.run_chunks(capture.mapped_chunks() if mapped else capture.chunks())
+        capture.close()
+    return (s.engine.end, counts[0], counts[1])
+
+def index_only(path, decoder_id, mapped=False, edges=False):
+    """
+    Reads and indexes a capture without decoding it.
+    """
+    if edges:
+        load_edges(path)
+        return
+    capture = Capture(path)
+    engine = EdgeEngine(capture.mapped_chunks() if mapped else capture.chunks(),
+                        Session(decoder_id).bits)
+    while engine.load():
+        engine.samplenum = engine.end
+    capture.close()
+
+def decoder_options(decoder_id, options):
+    """
+    Picks the options the decoder declares.
+    """
+    known = {o['id'] for o in getattr(load_decoder(decoder_id), 'options', ())}
+    return {k: v for k, v in options.items() if k in known}
+
+def bench(path, decoder_id, iterations, options=None, mapped=False, edges=False):
+    options = decoder_options(decoder_id, options or {})
+    seconds = []
+    for i in range(iterations):
+        t = time.perf_counter()
+        samples, annotations, frames = replay(path, decoder_id, options, mapped, edges)
+        seconds.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    index_only(path, decoder_id, mapped, edges)
+    index_seconds = time.perf_counter() - t
+
+    tracemalloc.start()
+    replay(path, decoder_id, options, mapped, edges)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = min(seconds)
+    return {
+        'capture': os.path.basename(path),
+        'decoder': decoder_id,
+        'options': options,
+        'mapped': mapped,
+        'edges': edges,
+        'samples': samples,
+        'annotations': annotations,
+        'frames': frames,
+        'iterations': iterations,
+        'seconds': seconds,
+        'index_seconds': index_seconds,
+        'samples_per_sec': samples / best,
+        'frames_per_sec': frames / best,
+        'peak_memory': peak_memory,
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=EXAMPLES_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old, new):
+    old = {(r['capture'], r['decoder']): r for r in old['results']}
+    for r in new['results']:
+        o = old.get((r['capture'], r['decoder']))
+        if o:
+            ratio = r['samples_per_sec'] / o['samples_per_sec']
+            print(f"{r['capture']:20} {r['decoder']:20} {ratio:6.2f}x "
+                  f"annotations {o['annotations']} -> {r['annotations']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=3)
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    parser.add_argument('--case', action='append', metavar='CAPTURE:DECODER',
+                        help='capture and decoder id, defaults to the examples')
+    parser.add_argument('-O', '--option', action='append', default=[], metavar='ID=VALUE',
+                        help='decoder option, applied to decoders that have it')
+    parser.add_argument('--mmap', action='store_true',
+                        help='read the samples from memory-mapped cache files')
+    parser.add_argument('--edges', action='store_true',
+                        help='read only the transitions from transition cache files')
+    args = parser.parse_args(argv)
+
+    cases = [c.rsplit(':', 1) for c in args.case] if args.case else \
+        [(os.path.join(EXAMPLES_DIR, c), d) for c, d in CASES]
+
+    results = []
+    for path, decoder_id in cases:
+        r = bench(path, decoder_id, args.iterations,
+                  dict(o.split('=', 1) for o in args.option), args.mmap, args.edges)
+        results.append(r)
+        print(f"{r['capture']:20} {r['decoder']:20} "
+              f"{r['samples_per_sec'] / 1e6:10.1f} Msamples/s "
+              f"{r['frames_per_sec']:10.1f} frames/s "
+              f"{r['annotations']:8} annotations "
+              f"{r['peak_memory'] / 2**20:8.1f} MiB peak", file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+'''
+Reader for sigrok session files (.sr, .srzip).
+
+A session file is a zip archive with an INI style "metadata" member and
+the logic samples split across "logic-1-1", "logic-1-2", ... members.
+
+Capture.mapped() decompresses the members once into a cache file next to
+the capture and maps it, the samples are then read straight from the page
+cache instead of being inflated into Python memory on every replay.
+'''
+
+import configparser
+import mmap
+import os
+import re
+import shutil
+import zipfile
+
+import numpy as np
+
+UNITS = {'': 1, 'k': 10**3, 'M': 10**6, 'G': 10**9}
+
+def parse_samplerate(s):
+    """
+    Parses sigrok samplerate strings such as '500 kHz' or '100 MHz'.
+    """
+    m = re.fullmatch(r'\s*([0-9.]+)\s*([kMG]?)Hz\s*', s)
+    if not m:
+        raise ValueError(f"Invalid samplerate {s!r}")
+    return int(float(m.group(1)) * UNITS[m.group(2)])
+
+def format_samplerate(samplerate):
+    for prefix in ('G', 'M', 'k'):
+        if samplerate >= UNITS[prefix] and samplerate % UNITS[prefix] == 0:
+            return f"{samplerate // UNITS[prefix]} {prefix}Hz"
+    return f"{samplerate} Hz"
+
+class Capture:
+    """
+    Logic samples of the first device in a sigrok session file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+
+        meta = configparser.ConfigParser(interpolation=None)
+        meta.read_string(self.zip.read('metadata').decode())
+        dev = meta['device 1']
+
+        self.samplerate = parse_samplerate(dev['samplerate'])
+        self.unitsize = int(dev['unitsize'])
+        self.dtype = np.dtype(f'<u{self.unitsize}')
+        # probe names by bit position
+        self.probes = {int(k[5:]) - 1: v for k, v in dev.items()
+                       if re.fullmatch(r'probe\d+', k)}
+
+        prefix = dev['capturefile'] + '-'
+        self.members = sorted(
+            (n for n in self.zip.namelist() if n.startswith(prefix)),
+            key=lambda n: int(n[len(prefix):]))
+
+    def __len__(self):
+        return sum(self.member_samples(n) for n in self.members)
+
+    def member_samples(self, name):
+        return self.zip.getinfo(name).file_size // self.unitsize
+
+    def chunks(self, members=None):
+        """
+        Yields the samples one archive member at a time.
+        """
+        for n in self.members if members is None else members:
+            yield np.frombuffer(self.zip.read(n), dtype=self.dtype)
+
+    def cache_path(self, cache_dir=None):
+        name = os.path.basename(self.path) + '.logic'
+        return os.path.join(cache_dir or os.path.dirname(self.path), name)
+
+    def mapped(self, cache_dir=None):
+        """
+        All samples as a read-only NumPy view over the memory-mapped cache file.
+        """
+        m = self.map_cache(cache_dir)
+        if m is None:
+            return np.empty(0, dtype=self.dtype)
+        # the view keeps the mapping alive
+        return np.frombuffer(m, dtype=self.dtype)
+
+    def mapped_chunks(self, chunk_size=1 << 22, cache_dir=None):
+        """
+        Yields chunk_size sample views of the memory-mapped cache file,
+        the pages of a chunk are released once the next one is asked for,
+        keeping the resident set constant regardless of the capture size.
+        """
+        m = self.map_cache(cache_dir)
+        if m is None:
+            return
+        samples = np.frombuffer(m, dtype=self.dtype)
+        page = mmap.PAGESIZE
+        for i in range(0, len(samples), chunk_size):
+            yield samples[i:i + chunk_size]
+            start = i * self.unitsize // page * page
+            end = min(len(m), (i + chunk_size) * self.unitsize) // page * page
+            if end > start:
+                m.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def map_cache(self, cache_dir=None):
+        """
+        Maps the cache file, written first if missing or older than the capture.
+
+        :return mmap, None for an empty capture
+        """
+        path = self.cache_path(cache_dir)
+        size = len(self) * self.unitsize
+        if not (os.path.exists(path) and os.path.getsize(path) == size and
+                os.path.getmtime(path) >= os.path.getmtime(self.path)):
+            self.write_cache(path)
+        if not size:
+            return None
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def write_cache(self, path):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            for n in self.members:
+                with self.zip.open(n) as member:
+                    shutil.copyfileobj(member, f, 1 << 20)
+        os.replace(tmp, path)
+
+    def close(self):
+        self.zip.close()
+
+class CaptureWriter:
+    """
+    Writes logic samples as a sigrok session file.
+
+    probes are the probe names by bit position,
+    samples are appended with write() and split into
+    archive members of chunk_size samples.
+    """
+
+    def __init__(self, path, samplerate, probes, unitsize=1, chunk_size=1 << 22):
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1)
+        self.dtype = np.dtype(f'<u{unitsize}')
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.num_pending = 0
+        self.num_members = 0
+
+        self.zip.writestr('version', '2')
+        self.zip.writestr('metadata', '\n'.join(
+            ['[global]', 'sigrok version=0.5.2', '', '[device 1]',
+             'capturefile=logic-1', f'total probes={8 * unitsize}',
+             f'samplerate={format_samplerate(samplerate)}', 'total analog=0'] +
+            [f'probe{i + 1}={name}' for i, name in enumerate(probes)] +
+            [f'unitsize={unitsize}', '']))
+
+    def write(self, samples):
+        self.pending.append(np.asarray(samples, dtype=self.dtype))
+        self.num_pending += len(samples)
+        while self.num_pending >= self.chunk_size:
+            self.flush(self.chunk_size)
+
+    def flush(self, n):
+        data = np.concatenate(self.pending)
+        self.num_members += 1
+        self.zip.writestr(f'logic-1-{self.num_members}', data[:n].tobytes())
+        self.pending = [data[n:]]
+        self.num_pending = len(data) - n
+
+    def close(self):
+        if self.num_pending:
+            self.flush(self.num_pending)
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,163 @@
+'''
+Transition cache of sigrok session files.
+
+Every logic bit of a capture is reduced once to the sample numbers at which
+it changes, stored delta and LEB128 varint encoded in a ".edges" file next
+to the capture, named after the capture's content hash. Replays load the
+transitions instead of decompressing and scanning the samples again.
+
+    edges = load_edges('example/hpil.sr')
+    s = Session('hpil', samplerate=edges.samplerate)
+    s.run_transitions(*edges.channels(s.bits), 0, edges.length)
+'''
+
+import glob
+import hashlib
+import os
+import struct
+
+import numpy as np
+
+from .capture import Capture
+from .engine import chunk_transitions
+
+MAGIC = b'SREDGES1'
+
+# samplerate, length, unitsize, first sample
+HEADER = struct.Struct('<QQQQ')
+
+# number of transitions, encoded size in bytes
+CHANNEL = struct.Struct('<QQ')
+
+def file_hash(path):
+    """
+    SHA-256 of a file's contents, hex encoded.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def encode_varints(values):
+    """
+    LEB128 encodes an array of non-negative integers.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        sizes += values >= np.uint64(1 << (7 * k))
+    # byte k of every value, 7 bits each
+    index = np.repeat(np.arange(len(values)), sizes)
+    k = np.arange(len(index)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    out = (values[index] >> (7 * k).astype(np.uint64)) & np.uint64(0x7f)
+    # continuation bit on all but the last byte of a value
+    out |= np.where(k < sizes[index] - 1, np.uint64(0x80), np.uint64(0))
+    return out.astype(np.uint8).tobytes()
+
+def decode_varints(data):
+    """
+    Inverse of encode_varints().
+    """
+    b = np.frombuffer(data, dtype=np.uint8)
+    if not len(b):
+        return np.empty(0, dtype=np.int64)
+    last = np.flatnonzero(b < 0x80)
+    starts = np.concatenate(([0], last[:-1] + 1))
+    k = np.arange(len(b)) - np.repeat(starts, last - starts + 1)
+    parts = (b & 0x7f).astype(np.uint64) << (7 * k).astype(np.uint64)
+    return np.add.reduceat(parts, starts).astype(np.int64)
+
+class Edges:
+    """
+    Transitions of every logic bit of a capture.
+
+    initial is the first sample, transitions[b] the sorted sample numbers
+    at which bit b differs from the preceding sample.
+    """
+
+    def __init__(self, samplerate, length, unitsize, initial, transitions):
+        self.samplerate = samplerate
+        self.length = length
+        self.unitsize = unitsize
+        self.initial = initial
+        self.transitions = transitions
+
+    @classmethod
+    def from_capture(cls, capture):
+        bits = list(range(8 * capture.unitsize))
+        parts = [[] for b in bits]
+        offset = 0
+        first = prev = None
+        for chunk in capture.chunks():
+            if not len(chunk):
+                continue
+            if first is None:
+                first = prev = chunk[0]
+            for b, t in enumerate(chunk_transitions(chunk, prev, bits, offset)):
+                parts[b].append(t)
+            offset += len(chunk)
+            prev = chunk[-1]
+        return cls(capture.samplerate, offset, capture.unitsize, int(first or 0),
+                   [np.concatenate(p) if p else np.empty(0, dtype=np.int64) for p in parts])
+
+    def channels(self, bits):
+        """
+        Transitions and values at sample 0 of the decoder channels
+        mapped to bits (None for unconnected channels).
+
+        :return (transitions, initial) for Session.run_transitions()
+        """
+        initial = [0 if b is None else (self.initial >> b) & 1 for b in bits]
+        transitions = [np.empty(0, dtype=np.int64) if b is None else self.transitions[b]
+                       for b in bits]
+        return (transitions, initial)
+
+    def save(self, path):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(self.samplerate, self.length, self.unitsize, self.initial))
+            for t in self.transitions:
+                data = encode_varints(np.diff(t, prepend=0))
+                f.write(CHANNEL.pack(len(t), len(data)))
+                f.write(data)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a transition cache: {path}")
+            samplerate, length, unitsize, initial = HEADER.unpack(f.read(HEADER.size))
+            transitions = []
+            for b in range(8 * unitsize):
+                count, size = CHANNEL.unpack(f.read(CHANNEL.size))
+                t = np.cumsum(decode_varints(f.read(size)))
+                if len(t) != count:
+                    raise ValueError(f"Truncated transition cache: {path}")
+                transitions.append(t)
+        return cls(samplerate, length, unitsize, initial, transitions)
+
+def edges_path(path, digest, cache_dir=None):
+    name = f'{os.path.basename(path)}.{digest[:16]}.edges'
+    return os.path.join(cache_dir or os.path.dirname(path), name)
+
+def load_edges(path, cache_dir=None):
+    """
+    Transitions of a capture, from the cache if it holds the capture's
+    content hash, otherwise indexed and cached, replacing stale entries.
+    """
+    cached = edges_path(path, file_hash(path), cache_dir)
+    if os.path.exists(cached):
+        return Edges.load(cached)
+
+    capture = Capture(path)
+    edges = Edges.from_capture(capture)
+    capture.close()
+
+    pattern = glob.escape(os.path.basename(path)) + '.*.edges'
+    for stale in glob.glob(os.path.join(cache_dir or os.path.dirname(path), pattern)):
+        os.remove(stale)
+    edges.save(cached)
+    return edges
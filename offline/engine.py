@@ -0,0 +1,275 @@
+'''
+wait() condition matching over per-channel transition indices.
+
+Logic samples are reduced to sorted arrays of the sample numbers at which
+each channel changes, wait() jumps between them with a binary search
+instead of looking at every sample.
+'''
+
+import numpy as np
+
+from . import srd
+
+TERMS = ('l', 'h', 'r', 'f', 'e', 'n')
+
+def parse_conditions(conds):
+    """
+    Normalizes wait() conditions.
+
+    :return tuple of (skip, terms) per condition,
+            skip is None or a sample count,
+            terms is a tuple of (channel, term type)
+    """
+    if conds is None:
+        conds = [{'skip': 1}]
+    elif isinstance(conds, dict):
+        conds = [conds]
+    if not conds:
+        conds = [{'skip': 1}]
+
+    result = []
+    for cond in conds:
+        key = tuple(cond.items())
+        parsed = PARSED.get(key)
+        if parsed is None:
+            parsed = parse_condition(cond)
+            # skip counts vary from call to call, terms alone do not
+            if parsed[0] is None and len(PARSED) < 4096:
+                PARSED[key] = parsed
+        result.append(parsed)
+    return tuple(result)
+
+# parse_condition() results by condition items
+PARSED = {}
+
+def parse_condition(cond):
+    skip = None
+    terms = []
+    for k, v in cond.items():
+        if k == 'skip':
+            skip = int(v)
+        elif v in TERMS:
+            terms.append((int(k), v))
+        else:
+            raise ValueError(f"Unsupported wait() term {k!r}: {v!r}")
+    return (skip, tuple(terms))
+
+def chunk_transitions(chunk, prev, bits, offset):
+    """
+    Finds the transitions of each channel within a chunk of samples.
+
+    prev is the sample preceding the chunk, offset the sample number
+    of the chunk's first sample.
+
+    :return list of sorted sample number arrays, one per channel
+    """
+    mask = sum(1 << b for b in bits if b is not None)
+    d = np.empty(len(chunk), dtype=chunk.dtype)
+    d[0] = prev ^ chunk[0]
+    np.bitwise_xor(chunk[1:], chunk[:-1], out=d[1:])
+    d &= chunk.dtype.type(mask)
+    idx = np.flatnonzero(d)
+    dv = d[idx]
+    idx += offset
+
+    return [np.empty(0, dtype=np.int64) if b is None else idx[((dv >> b) & 1) != 0]
+            for b in bits]
+
+def sample_values(sample, bits):
+    return [0 if b is None else (int(sample) >> b) & 1 for b in bits]
+
+class EdgeEngine:
+    """
+    Matches wait() conditions against per-channel transition arrays.
+
+    chunks is an iterable of NumPy arrays of unsigned ints, one per sample,
+    consumed lazily as wait() runs past the samples seen so far.
+    bits maps decoder channel indices to bit positions within a sample
+    (None for unconnected channels).
+    """
+
+    def __init__(self, chunks, bits):
+        self.chunks = iter(chunks)
+        self.bits = bits
+        self.samplenum = 0
+        self.started = False
+
+        # Window of known samples [base, end), t[ch] holds the transitions
+        # in (base, end), v0[ch] is the channel value at base.
+        self.base = self.end = 0
+        self.last = None
+        self.t = [np.empty(0, dtype=np.int64) for b in bits]
+        self.v0 = [0 for b in bits]
+
+        # (first, match) by the terms of conditions without skip, see match()
+        self.matches = {}
+
+        # pins() of the last sample asked for, see pins()
+        self.pins_at = None
+
+    @classmethod
+    def from_transitions(cls, transitions, initial, start, end, bits):
+        """
+        Engine over already indexed samples [start, end),
+        initial holds the channel values at start.
+        """
+        engine = cls((), bits)
+        engine.samplenum = engine.base = start
+        engine.end = end
+        engine.v0 = list(initial)
+        engine.t = [t[t.searchsorted(start, 'right'):t.searchsorted(end)] for t in transitions]
+        return engine
+
+    def load(self):
+        """
+        Indexes the next chunk of samples.
+
+        :return False once the chunks are exhausted
+        """
+        chunk = None
+        while chunk is None or not len(chunk):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return False
+            chunk = np.asarray(chunk)
+
+        if self.last is None:
+            self.last = chunk[0]
+            self.v0 = sample_values(chunk[0], self.bits)
+
+        # Drop transitions that can no longer be looked at.
+        keep = self.samplenum
+        for ch, t in enumerate(self.t):
+            k = int(t.searchsorted(keep, 'right'))
+            self.v0[ch] ^= k & 1
+            self.t[ch] = t[k:]
+        self.base = keep
+
+        new = chunk_transitions(chunk, self.last, self.bits, self.end)
+        for ch, t in enumerate(new):
+            if len(t):
+                self.t[ch] = np.concatenate((self.t[ch], t))
+
+        self.pins_at = None
+        self.end += len(chunk)
+        self.last = chunk[-1]
+        return True
+
+    def value(self, ch, s):
+        return self.v0[ch] ^ (int(self.t[ch].searchsorted(s, 'right')) & 1)
+
+    def pins(self, s):
+        """
+        Channel values at s. Since s only moves forward between loads, only
+        channels with a transition since the last call are looked up again.
+        """
+        if self.pins_at is None or s < self.pins_at:
+            self.counts = [int(t.searchsorted(s, 'right')) for t in self.t]
+            self.changes = [int(t[k]) if k < len(t) else None
+                            for t, k in zip(self.t, self.counts)]
+            self.pins_list = [None if b is None else self.v0[ch] ^ (k & 1)
+                              for ch, (b, k) in enumerate(zip(self.bits, self.counts))]
+        elif s < self.next_change:
+            self.pins_at = s
+            return self.pins_values
+        else:
+            for ch, c in enumerate(self.changes):
+                if c is not None and c <= s:
+                    t = self.t[ch]
+                    k = self.counts[ch] = int(t.searchsorted(s, 'right'))
+                    self.changes[ch] = int(t[k]) if k < len(t) else None
+                    self.pins_list[ch] = self.v0[ch] ^ (k & 1)
+
+        self.pins_at = s
+        pending = [c for c in self.changes if c is not None]
+        self.next_change = min(pending) if pending else self.end
+        self.pins_values = tuple(self.pins_list)
+        return self.pins_values
+
+    def next_term(self, ch, kind, s):
+        """
+        :return first sample >= s at which the term holds,
+                None if there is none among the known samples
+        """
+        t = self.t[ch]
+        n = len(t)
+        i = int(t.searchsorted(s))
+
+        if kind == 'h' or kind == 'l':
+            k = i + 1 if i < n and t[i] == s else i
+            if self.v0[ch] ^ (k & 1) == (kind == 'h'):
+                return s
+            return int(t[k]) if k < n else None
+        elif kind == 'e':
+            return int(t[i]) if i < n else None
+        elif kind == 'n':
+            while i < n and t[i] == s:
+                i += 1
+                s += 1
+            return s if s < self.end else None
+        else:
+            # Values alternate, transition i sets the channel to v0 ^ ~i.
+            if self.v0[ch] ^ ((i + 1) & 1) != (kind == 'r'):
+                i += 1
+            return int(t[i]) if i < n else None
+
+    def next_match(self, first, skip, terms):
+        """
+        Like libsigrokdecode's skip term, a skip counts from the current
+        sample and once met holds until the other terms do.
+
+        :return first sample >= first (and >= samplenum + skip) matching
+                all terms, None if there is none among the known samples
+        """
+        s = first if skip is None else max(self.samplenum + skip, first)
+        while s < self.end:
+            nxt = s
+            for ch, kind in terms:
+                m = self.next_term(ch, kind, s)
+                if m is None:
+                    return None
+                if m > nxt:
+                    nxt = m
+            if nxt == s:
+                return s
+            s = nxt
+        return None
+
+    def match(self, first, skip, terms):
+        """
+        next_match() remembering the matches of conditions without skip:
+        a match m found from first is still the first match from any later
+        sample up to m, so decoders waiting on the same conditions over and
+        over (e.g. an edge on any of several channels) only search again
+        for the conditions that matched last.
+        """
+        if skip is None:
+            m = self.matches.get(terms)
+            if m is not None and m[0] <= first <= m[1]:
+                return m[1]
+        s = self.next_match(first, skip, terms)
+        if skip is None and s is not None:
+            self.matches[terms] = (first, s)
+        return s
+
+    def wait(self, conds):
+        """
+        Advances to the next sample matching any of the conditions.
+
+        :return (samplenum, pins, matched)
+        """
+        conds = parse_conditions(conds)
+        first = self.samplenum + 1 if self.started else self.samplenum
+        self.started = True
+
+        while True:
+            hits = [self.match(first, skip, terms) for skip, terms in conds]
+            found = [s for s in hits if s is not None]
+            if found:
+                s = min(found)
+                self.samplenum = s
+                return (s, self.pins(s), tuple(h == s for h in hits))
+
+            if not self.load():
+                self.samplenum = self.end
+                raise srd.EndOfData()
@@ -0,0 +1,202 @@
+'''
+Parallel decoding of a single capture.
+
+The capture is indexed into per-channel transitions by a process pool,
+one group of archive members per worker, then cut in the middle of idle
+gaps long enough that no frame can span them, and the pieces are decoded
+by the pool and put back together in sample order.
+
+    python -m offline.parallel example/hpil.sr hpil -j 8
+'''
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import srd
+from .capture import Capture
+from .engine import chunk_transitions, sample_values
+from .session import Session, decoder_options, load_decoder
+
+# Longest EOX-9906 frame: 36 x (0.5ms pulse + 2ms pause) plus margin.
+EOX9906_FRAME_SECONDS = 0.1
+
+# HP-IL cuts need an idle gap of this many pulse widths (~10ms),
+# well above the gaps between the frames of a record.
+HPIL_GAP_PULSES = 5000
+
+def eox9906_min_gap(samplerate, transitions, options):
+    """
+    A frame after the gap must not count as a repeat of one before it,
+    the pieces do not share their repeat windows.
+    """
+    return int((EOX9906_FRAME_SECONDS + options.get('repeat_window_ms', 0) / 1000) * samplerate)
+
+def hpil_min_gap(samplerate, transitions, options):
+    """
+    Pulse width estimated from the median low time of the
+    (inverted) channels, a pulse has two halves.
+    """
+    lows = []
+    for t in transitions:
+        if len(t) > 1:
+            lows.append(np.diff(t)[::2])
+    if not lows:
+        return samplerate
+    return int(HPIL_GAP_PULSES * 2 * np.median(np.concatenate(lows)))
+
+MIN_GAPS = {
+    'elegiant-eox9906': eox9906_min_gap,
+    'elegiant-eox9906-multi': eox9906_min_gap,
+    'hpil': hpil_min_gap,
+}
+
+def index_members(path, members, offset, bits):
+    """
+    Transitions of a group of archive members starting at sample offset.
+
+    :return (first sample, last sample, transitions per channel)
+    """
+    capture = Capture(path)
+    first = prev = None
+    parts = [[] for b in bits]
+    for chunk in capture.chunks(members):
+        if not len(chunk):
+            continue
+        if first is None:
+            first = prev = chunk[0]
+        for ch, t in enumerate(chunk_transitions(chunk, prev, bits, offset)):
+            parts[ch].append(t)
+        offset += len(chunk)
+        prev = chunk[-1]
+    capture.close()
+    return (first, prev, [np.concatenate(p) if p else np.empty(0, dtype=np.int64)
+                          for p in parts])
+
+def index_capture(pool, capture, bits, groups):
+    """
+    Indexes a capture in parallel.
+
+    :return (channel values at sample 0, transitions per channel)
+    """
+    members = capture.members
+    per_group = max(1, -(-len(members) // groups))
+    jobs = []
+    offset = 0
+    for i in range(0, len(members), per_group):
+        group = members[i:i + per_group]
+        jobs.append((offset, pool.submit(index_members, capture.path, group, offset, bits)))
+        offset += sum(capture.member_samples(n) for n in group)
+
+    initial = sample_values(0, bits)
+    parts = [[] for b in bits]
+    prev = None
+    for offset, job in jobs:
+        first, last, transitions = job.result()
+        if first is None:
+            continue
+        if prev is None:
+            initial = sample_values(first, bits)
+        else:
+            # transitions across the group boundary
+            edges = chunk_transitions(np.array([first]), prev, bits, offset)
+            for ch, t in enumerate(edges):
+                parts[ch].append(t)
+        for ch, t in enumerate(transitions):
+            parts[ch].append(t)
+        prev = last
+
+    return (initial, [np.concatenate(p) if p else np.empty(0, dtype=np.int64) for p in parts])
+
+def cut_points(transitions, length, min_gap, pieces):
+    """
+    Picks up to pieces - 1 cut points in the middle of idle gaps
+    longer than min_gap, as close as possible to evenly spaced.
+    """
+    edges = np.unique(np.concatenate(transitions + [np.array([0, length], dtype=np.int64)]))
+    gaps = np.flatnonzero(np.diff(edges) > min_gap)
+    if not len(gaps):
+        return []
+    middles = (edges[gaps] + edges[gaps + 1]) // 2
+
+    cuts = set()
+    for k in range(1, pieces):
+        i = int(middles.searchsorted(k * length // pieces))
+        near = [middles[j] for j in (i - 1, i) if 0 <= j < len(middles)]
+        cuts.add(int(min(near, key=lambda m: abs(m - k * length // pieces))))
+    return sorted(cuts)
+
+def decode_range(decoder_id, samplerate, options, channels, initial, transitions, start, end):
+    """
+    Decodes samples [start, end) in a worker.
+
+    :return list of (output type, start sample, end sample, data)
+    """
+    s = Session(decoder_id, samplerate=samplerate, channels=channels, options=options)
+    out = []
+    for output_type in (srd.OUTPUT_ANN, srd.OUTPUT_PYTHON, srd.OUTPUT_BINARY, srd.OUTPUT_META):
+        s.add_callback(output_type,
+                       lambda ss, es, data, t=output_type: out.append((t, ss, es, data)))
+    s.run_transitions(transitions, initial, start, end)
+    return out
+
+def decode_parallel(path, decoder_id, jobs=None, pieces=None, min_gap=None,
+                    options=None, channels=None):
+    """
+    Decodes a capture in a process pool.
+
+    :return list of (output type, start sample, end sample, data) in sample order
+    """
+    jobs = jobs or os.cpu_count()
+    pieces = pieces or 4 * jobs
+    capture = Capture(path)
+    length = len(capture)
+    decoder = load_decoder(decoder_id)
+    bits = Session(decoder, channels=channels).bits
+
+    with ProcessPoolExecutor(jobs) as pool:
+        initial, transitions = index_capture(pool, capture, bits, jobs)
+
+        if min_gap is None:
+            min_gap = MIN_GAPS.get(decoder_id, eox9906_min_gap)(
+                capture.samplerate, transitions, decoder_options(decoder, options or {}))
+        bounds = [0] + cut_points(transitions, length, min_gap, pieces) + [length]
+
+        results = []
+        for start, end in zip(bounds, bounds[1:]):
+            # channel values at the start of the piece, transitions within it
+            values = [v ^ (int(t.searchsorted(start, 'right')) & 1)
+                      for v, t in zip(initial, transitions)]
+            arrays = [t[t.searchsorted(start, 'right'):t.searchsorted(end)] for t in transitions]
+            results.append(pool.submit(decode_range, decoder_id, capture.samplerate,
+                                       options, channels, values, arrays, start, end))
+
+        out = []
+        for r in results:
+            out.extend(r.result())
+
+    capture.close()
+    return out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('capture')
+    parser.add_argument('decoder')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes')
+    parser.add_argument('--pieces', type=int, help='number of pieces, default 4 per worker')
+    parser.add_argument('--min-gap', type=int, help='minimum idle gap to cut at, in samples')
+    parser.add_argument('-O', '--option', action='append', default=[], metavar='ID=VALUE')
+    args = parser.parse_args(argv)
+
+    decoder = load_decoder(args.decoder)
+    out = decode_parallel(args.capture, args.decoder, args.jobs, args.pieces, args.min_gap,
+                          dict(o.split('=', 1) for o in args.option))
+    for output_type, ss, es, data in out:
+        if output_type == srd.OUTPUT_ANN:
+            texts = ' '.join(f'"{t}"' for t in data[1])
+            print(f"{ss}-{es} {decoder.id}: {decoder.annotations[data[0]][0]}: {texts}")
+
+if __name__ == '__main__':
+    main()
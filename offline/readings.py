@@ -0,0 +1,128 @@
+'''
+EOX-9906 weather readings stored in SQLite.
+
+    python -m offline.readings weather.db archive/*.sr
+    sigrok-cli ... -O binary | python -m offline.stream elegiant-eox9906 -s 500k --sqlite weather.db
+
+The decoder's ['READING', ...] outputs are buffered and inserted one
+transaction per batch into a time indexed table of a WAL mode database.
+'''
+
+import argparse
+import sqlite3
+import sys
+import time
+
+from . import srd
+from .capture import Capture
+from .session import Session
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS readings (
+    time REAL NOT NULL,
+    source TEXT NOT NULL,
+    channel INTEGER NOT NULL,
+    battery_ok INTEGER NOT NULL,
+    temperature REAL NOT NULL,
+    humidity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS readings_time ON readings (time);
+CREATE INDEX IF NOT EXISTS readings_channel_time ON readings (source, channel, time);
+'''
+
+INSERT = 'INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?)'
+
+class ReadingSink:
+    """
+    Batches readings into the SQLite database at path.
+
+    Pending readings are committed once there are batch_size of them,
+    or when one is added interval seconds (wall clock) after the last
+    commit, so that a slow live stream still reaches the database.
+    """
+
+    def __init__(self, path, batch_size=1000, interval=60.0):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []
+        self.committed = time.monotonic()
+
+    def add(self, t, source, reading):
+        """
+        :param t reading time, seconds since the epoch
+        :param source capture or station name
+        :param reading (channel, battery ok, temperature, humidity)
+        """
+        ch, bat_ok, temp, rh = reading
+        self.pending.append((t, source, ch, int(bat_ok), temp, rh))
+        if (len(self.pending) >= self.batch_size or
+                time.monotonic() - self.committed >= self.interval):
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with self.db:
+                self.db.executemany(INSERT, self.pending)
+            self.pending = []
+        self.committed = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def callback(self, source, start, samplerate):
+        """
+        OUTPUT_PYTHON callback adding the readings of a session,
+        start is the time of sample 0. Readings of the multi receiver
+        decoder are stored with the receiver appended to the source.
+        """
+        def on_python(ss, es, data):
+            if data[0] == 'READING':
+                name = source if len(data) < 3 else f'{source}/ook{data[2]}'
+                self.add(start + ss / samplerate, name, data[1])
+        return on_python
+
+def capture_start(capture):
+    """
+    Time of the first sample, sigrok saves a capture once it ends
+    (zip timestamps are local time).
+    """
+    saved = time.mktime(capture.zip.getinfo('metadata').date_time + (0, 0, -1))
+    return saved - len(capture) / capture.samplerate
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('captures', nargs='+')
+    parser.add_argument('-P', '--decoder', default='elegiant-eox9906',
+                        choices=('elegiant-eox9906', 'elegiant-eox9906-multi'))
+    parser.add_argument('-C', '--channel', action='append', default=[], metavar='ID=BIT',
+                        help='bit position of a decoder channel')
+    parser.add_argument('-O', '--option', action='append', default=[], metavar='ID=VALUE')
+    parser.add_argument('--batch-size', type=int, default=1000, help='readings per transaction')
+    args = parser.parse_args(argv)
+
+    with ReadingSink(args.database, args.batch_size) as sink:
+        for path in args.captures:
+            capture = Capture(path)
+            s = Session(args.decoder, samplerate=capture.samplerate,
+                        channels={k: int(v) for k, v in (c.split('=', 1) for c in args.channel)},
+                        options=dict(o.split('=', 1) for o in args.option))
+            s.add_callback(srd.OUTPUT_PYTHON,
+                           sink.callback(path, capture_start(capture), capture.samplerate))
+            s.run_chunks(capture.chunks())
+            capture.close()
+            print(f"{path}: done", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
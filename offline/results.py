@@ -0,0 +1,123 @@
+'''
+Content-addressed cache of decoder output rows.
+
+Entries are keyed by the capture's content hash, the decoder id, the hash of
+the decoder package's sources and the options, so a capture is only decoded
+again when one of them changes. Each entry holds the output rows as gzipped
+JSON Lines, the least recently used entries are evicted once the cache grows
+past its size limit.
+'''
+
+import glob
+import gzip
+import hashlib
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+from .edges import file_hash
+from .session import decoder_options
+
+DEFAULT_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'libsigrokdecode-custom', 'results')
+
+DEFAULT_SIZE = 1 << 30
+
+def decoder_hash(decoder):
+    """
+    SHA-256 over the sources of a Decoder class's package and of the
+    helper packages (*_common) shared by the decoders next to it.
+    """
+    package = os.path.dirname(sys.modules[decoder.__module__].__file__)
+    decoders = os.path.dirname(package)
+    names = glob.glob(os.path.join(package, '*.py'))
+    names += glob.glob(os.path.join(decoders, '*_common', '*.py'))
+    h = hashlib.sha256()
+    for name in sorted(names):
+        h.update(os.path.relpath(name, decoders).encode() + b'\0')
+        h.update(file_hash(name).encode())
+    return h.hexdigest()
+
+class ResultCache:
+    """
+    Output rows by (capture, decoder, options) in the directory path,
+    bounded to max_size bytes.
+    """
+
+    def __init__(self, path=DEFAULT_DIR, max_size=DEFAULT_SIZE):
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, capture, decoder, options, *extra):
+        """
+        :param capture capture file path
+        :param decoder Decoder class
+        :param options decoder options, the same values given as strings
+                       or left at their defaults give the same key
+        :param extra anything else the rows depend on, JSON serializable
+        """
+        options = decoder_options(decoder, options)
+        k = json.dumps([file_hash(capture), decoder.id, decoder_hash(decoder),
+                        sorted(options.items()), extra], default=str)
+        return hashlib.sha256(k.encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key + '.jsonl.gz')
+
+    def get(self, key):
+        """
+        :return iterator over the rows (JSON text lines) of an entry, None if missing
+        """
+        path = self.entry_path(key)
+        try:
+            f = gzip.open(path, 'rt')
+            # modification time orders entries for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return self.lines(f)
+
+    def lines(self, f):
+        with f:
+            yield from f
+
+    @contextmanager
+    def put(self, key):
+        """
+        Text file to write an entry's rows to, the entry
+        only appears once the block exits without an error.
+        """
+        path = self.entry_path(key)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with gzip.open(tmp, 'wt') as f:
+                yield f
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits max_size.
+        """
+        entries = []
+        for name in glob.glob(os.path.join(self.path, '*.jsonl.gz')):
+            try:
+                st = os.stat(name)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        size = sum(e[1] for e in entries)
+        for mtime, n, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+            size -= n
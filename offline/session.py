@@ -0,0 +1,172 @@
+'''
+Loads decoders from the "decoders" directory and replays logic samples
+into them.
+'''
+
+import importlib
+import os
+import sys
+
+import numpy as np
+
+from . import srd
+from .engine import EdgeEngine
+
+DECODERS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'decoders')
+
+def load_decoder(decoder_id, path=DECODERS_DIR):
+    """
+    Imports a decoder package by its id (e.g. 'hpil', 'elegiant-eox9906')
+    and returns its Decoder class.
+    """
+    sys.modules.setdefault('sigrokdecode', srd)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+    candidates = [decoder_id.replace('-', '_')]
+    candidates += sorted(d for d in os.listdir(path) if d not in candidates and
+                         os.path.isfile(os.path.join(path, d, '__init__.py')))
+    for name in candidates:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        decoder = getattr(module, 'Decoder', None)
+        if decoder is not None and decoder.id == decoder_id:
+            return decoder
+
+    raise ValueError(f"Unknown decoder {decoder_id!r}")
+
+def decoder_options(decoder, options):
+    """
+    All options of a Decoder class, its defaults overridden by options
+    converted to the type of the default (e.g. from '12.5' strings).
+    """
+    defaults = {o['id']: o['default'] for o in getattr(decoder, 'options', ())}
+    unknown = set(options) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown options {sorted(unknown)}")
+
+    result = dict(defaults)
+    for k, v in options.items():
+        result[k] = type(defaults[k])(v)
+    return result
+
+class Session:
+    """
+    Runs a single decoder instance over a logic sample buffer.
+
+    decoder is a Decoder class or a decoder id,
+    channels maps channel ids to bit positions within a sample
+    (required channels default to their index),
+    options overrides the decoder's option defaults.
+    """
+
+    def __init__(self, decoder, samplerate=None, channels=None, options=None):
+        if isinstance(decoder, str):
+            decoder = load_decoder(decoder)
+
+        self.decoder = decoder
+        self.samplerate = samplerate
+        self.bits = self.channel_bits(channels or {})
+        self.outputs = []
+        self.callbacks = {}
+        self.stacked = []
+        self.engine = None
+
+        self.inst = decoder()
+        self.inst._session = self
+        self.inst.options = decoder_options(decoder, options or {})
+
+    def channel_bits(self, channels):
+        required = getattr(self.decoder, 'channels', ())
+        optional = getattr(self.decoder, 'optional_channels', ())
+        ids = [c['id'] for c in required + optional]
+        unknown = set(channels) - set(ids)
+        if unknown:
+            raise ValueError(f"Unknown channels {sorted(unknown)}")
+
+        return [channels.get(cid, i if i < len(required) else None)
+                for i, cid in enumerate(ids)]
+
+    def add_callback(self, output_type, callback):
+        """
+        Registers callback(startsample, endsample, data)
+        for all outputs of the given type (srd.OUTPUT_ANN etc).
+        """
+        self.callbacks.setdefault(output_type, []).append(callback)
+
+    def stack(self, decoder, options=None):
+        """
+        Stacks a decoder on top of this one, its decode(ss, es, data)
+        receives everything this decoder puts on OUTPUT_PYTHON.
+
+        :return Session of the stacked decoder
+        """
+        upper = Session(decoder, samplerate=self.samplerate, options=options)
+        if not set(upper.decoder.inputs) & set(getattr(self.decoder, 'outputs', ())):
+            raise ValueError(f"{upper.decoder.id} can not be stacked on {self.decoder.id}")
+        self.stacked.append(upper)
+        return upper
+
+    def register(self, output_type, meta=None):
+        self.outputs.append((output_type, meta))
+        return len(self.outputs) - 1
+
+    def put(self, startsample, endsample, output_id, data):
+        output_type = self.outputs[output_id][0]
+        for cb in self.callbacks.get(output_type, ()):
+            cb(startsample, endsample, data)
+        if output_type == srd.OUTPUT_PYTHON:
+            for upper in self.stacked:
+                upper.inst.decode(startsample, endsample, data)
+
+    def has_channel(self, index):
+        return self.bits[index] is not None
+
+    def wait(self, conds):
+        samplenum, pins, matched = self.engine.wait(conds)
+        self.inst.samplenum = samplenum
+        self.inst.matched = matched
+        return pins
+
+    def start(self):
+        if self.samplerate is not None and hasattr(self.inst, 'metadata'):
+            self.inst.metadata(srd.SRD_CONF_SAMPLERATE, self.samplerate)
+        self.inst.start()
+        for upper in self.stacked:
+            upper.start()
+
+    def run(self, samples, chunk_size=1 << 22):
+        """
+        Decodes samples (a NumPy array or sequence of ints, one per sample)
+        until they are exhausted.
+        """
+        samples = np.asarray(samples)
+        self.run_chunks(samples[i:i + chunk_size]
+                        for i in range(0, len(samples), chunk_size))
+
+    def run_chunks(self, chunks):
+        """
+        Decodes an iterable of sample arrays as one contiguous capture,
+        chunks are only read as far as the decoder gets.
+        """
+        self.run_engine(EdgeEngine(chunks, self.bits))
+
+    def run_transitions(self, transitions, initial, start, end):
+        """
+        Decodes samples [start, end) given as per-channel transition arrays
+        and the channel values at start.
+        """
+        self.run_engine(EdgeEngine.from_transitions(
+            transitions, initial, start, end, self.bits))
+
+    def run_engine(self, engine):
+        self.engine = engine
+        self.start()
+
+        try:
+            self.inst.decode()
+        except srd.EndOfData:
+            pass
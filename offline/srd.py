@@ -0,0 +1,43 @@
+'''
+Pure-Python stand-in for the "sigrokdecode" module of libsigrokdecode.
+
+Only the subset of the API used by the decoders in this repository
+is provided, see https://sigrok.org/wiki/Protocol_decoder_API
+'''
+
+OUTPUT_ANN = 0
+OUTPUT_PYTHON = 1
+OUTPUT_BINARY = 2
+OUTPUT_LOGIC = 3
+OUTPUT_META = 4
+
+SRD_CONF_SAMPLERATE = 10000
+
+class EndOfData(Exception):
+    """
+    Raised by wait() once the sample source is exhausted,
+    ends the otherwise infinite decode() loop.
+    """
+
+class Decoder:
+    """
+    Base class for protocol decoders.
+
+    Instances are bound to a Session which provides the sample source
+    and collects the output.
+    """
+
+    samplenum = 0
+    matched = None
+
+    def register(self, output_type, proto_id=None, meta=None):
+        return self._session.register(output_type, meta)
+
+    def put(self, startsample, endsample, output_id, data):
+        self._session.put(startsample, endsample, output_id, data)
+
+    def wait(self, conds=None):
+        return self._session.wait(conds)
+
+    def has_channel(self, index):
+        return self._session.has_channel(index)
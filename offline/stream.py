@@ -0,0 +1,93 @@
+'''
+Live decoding of raw logic samples piped from sigrok-cli.
+
+    sigrok-cli -d fx2lafw -c samplerate=500k --continuous -O binary |
+        python -m offline.stream elegiant-eox9906 -s 500k -A decoded
+
+Samples are read from stdin into one fixed-size buffer and handed to the
+decoder chunk by chunk as they arrive, annotations are printed (and flushed)
+as soon as the decoder puts them. The decoder only keeps the transitions
+it can still look at, so memory stays constant however long it runs.
+'''
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from . import srd
+from .capture import parse_samplerate
+from .readings import ReadingSink
+from .session import Session, load_decoder
+
+def read_chunks(f, unitsize=1, chunk_size=1 << 16):
+    """
+    Yields arrays of the samples read from a binary stream, each a view of
+    the same buffer of chunk_size samples, valid until the next one is asked
+    for. A read returns whatever the pipe holds, so chunks are short while
+    samples trickle in.
+    """
+    buf = bytearray(chunk_size * unitsize)
+    view = memoryview(buf)
+    dtype = np.dtype(f'<u{unitsize}')
+    pending = 0
+    while True:
+        n = f.readinto(view[pending:])
+        if not n:
+            return
+        n += pending
+        whole = n - n % unitsize
+        if whole:
+            yield np.frombuffer(buf, dtype=dtype, count=whole // unitsize)
+        # carry a partial sample over to the next read
+        pending = n - whole
+        view[:pending] = view[whole:n]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('decoder')
+    parser.add_argument('-s', '--samplerate', required=True, help="e.g. '500k' or '100 MHz'")
+    parser.add_argument('-u', '--unitsize', type=int, default=1, help='bytes per sample')
+    parser.add_argument('-C', '--channel', action='append', default=[], metavar='ID=BIT',
+                        help='bit position of a decoder channel')
+    parser.add_argument('-O', '--option', action='append', default=[], metavar='ID=VALUE')
+    parser.add_argument('-A', '--annotation', action='append', metavar='ID',
+                        help='annotation classes to print, default all')
+    parser.add_argument('--chunk-size', type=int, default=1 << 16, help='samples per read')
+    parser.add_argument('--sqlite', metavar='DATABASE',
+                        help="store ['READING', ...] outputs, see offline.readings")
+    parser.add_argument('--source', default='stdin', help='source name of stored readings')
+    args = parser.parse_args(argv)
+
+    samplerate = args.samplerate
+    if not samplerate.endswith('Hz'):
+        samplerate += 'Hz'
+
+    decoder = load_decoder(args.decoder)
+    classes = [a[0] for a in decoder.annotations]
+    shown = set(classes.index(a) for a in args.annotation) if args.annotation else None
+
+    def on_ann(ss, es, data):
+        if shown is None or data[0] in shown:
+            texts = ' '.join(f'"{t}"' for t in data[1])
+            print(f"{ss}-{es} {decoder.id}: {classes[data[0]]}: {texts}", flush=True)
+
+    s = Session(decoder, samplerate=parse_samplerate(samplerate),
+                channels={k: int(v) for k, v in (c.split('=', 1) for c in args.channel)},
+                options=dict(o.split('=', 1) for o in args.option))
+    s.add_callback(srd.OUTPUT_ANN, on_ann)
+    sink = None
+    if args.sqlite:
+        sink = ReadingSink(args.sqlite)
+        s.add_callback(srd.OUTPUT_PYTHON, sink.callback(args.source, time.time(), s.samplerate))
+    try:
+        s.run_chunks(read_chunks(sys.stdin.buffer.raw, args.unitsize, args.chunk_size))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sink:
+            sink.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+'''
+Synthetic EOX-9906 and HP-IL captures for benchmarks and soak tests.
+
+    python -m offline.synth elegiant-eox9906 eox.sr --samplerate 500k --duration 3600
+    python -m offline.synth hpil hpil.sr --samplerate 100M --size 1G --noise 100
+'''
+
+import argparse
+import math
+import random
+
+import numpy as np
+
+from .capture import CaptureWriter
+
+SUFFIXES = {'': 1, 'k': 10**3, 'M': 10**6, 'G': 10**9}
+
+def parse_number(s):
+    """
+    Parses '500k', '100M', '1G' style numbers.
+    """
+    s = s.strip()
+    suffix = s[-1] if s[-1] in SUFFIXES and s[-1] != '' else ''
+    return int(float(s[:len(s) - len(suffix)]) * SUFFIXES[suffix])
+
+class Generator:
+    """
+    Accumulates runs of constant sample values and renders them
+    into a capture, subclasses define frame() which emits the runs
+    of one interval (a burst or message and the idle line before it).
+
+    jitter is the relative standard deviation applied to every timing,
+    noise is the mean number of glitches per second of idle line,
+    interval overrides the period of the bursts or messages.
+    """
+
+    probes = ()
+    idle_value = 0
+
+    def __init__(self, samplerate, jitter=0.0, noise=0.0, glitch=1e-6, interval=None,
+                 seed=None):
+        self.samplerate = samplerate
+        self.jitter = jitter
+        self.noise = noise
+        self.glitch = glitch
+        if interval is not None:
+            self.interval = interval
+        self.rng = random.Random(seed)
+        self.values = []
+        self.lengths = []
+        self.pending = 0
+
+    def samples(self, seconds):
+        if self.jitter:
+            seconds *= 1 + self.rng.gauss(0, self.jitter)
+        return max(1, round(seconds * self.samplerate))
+
+    def emit(self, value, seconds):
+        n = self.samples(seconds)
+        self.values.append(value)
+        self.lengths.append(n)
+        self.pending += n
+
+    def idle(self, seconds):
+        """
+        Idle line with randomly placed glitches.
+        """
+        num_glitches = self.poisson(self.noise * seconds)
+        at = sorted(self.rng.uniform(0, seconds) for i in range(num_glitches))
+        t = 0
+        for g in at:
+            if g > t:
+                self.emit(self.idle_value, g - t)
+            width = self.rng.uniform(1 / self.samplerate, self.glitch)
+            self.emit(self.idle_value ^ (1 << self.rng.randrange(len(self.probes))), width)
+            t = max(t, g) + width
+        if seconds > t:
+            self.emit(self.idle_value, seconds - t)
+
+    def poisson(self, lam):
+        # Knuth for small means, normal approximation otherwise
+        if lam > 30:
+            return max(0, round(self.rng.gauss(lam, math.sqrt(lam))))
+        n, p, limit = 0, 1.0, math.exp(-lam)
+        while True:
+            p *= self.rng.random()
+            if p <= limit:
+                return n
+            n += 1
+
+    def render(self, writer, num_samples, chunk_size=1 << 22):
+        """
+        Writes num_samples samples chunk_size at a time, runs longer than
+        a chunk (a whole idle interval) are split across chunks.
+        """
+        written = 0
+        while written < num_samples:
+            n = min(chunk_size, num_samples - written)
+            while self.pending < n:
+                self.frame()
+            values, lengths = self.take(n)
+            writer.write(np.repeat(np.array(values, dtype=writer.dtype), lengths))
+            written += n
+
+    def take(self, n):
+        """
+        Removes the runs of the next n samples, the last one may be cut short.
+
+        :return (values, lengths)
+        """
+        ends = np.cumsum(self.lengths)
+        i = int(np.searchsorted(ends, n))
+        values, lengths = self.values[:i + 1], self.lengths[:i + 1]
+        rest = int(ends[i]) - n
+        lengths[-1] -= rest
+        if rest:
+            self.values, self.lengths = self.values[i:], [rest] + self.lengths[i + 1:]
+        else:
+            self.values, self.lengths = self.values[i + 1:], self.lengths[i + 1:]
+        self.pending -= n
+        return values, lengths
+
+class EOX9906(Generator):
+    """
+    OOK bursts: repeats x (preamble of 4 long pauses, 4 bytes, trailing pulse),
+    one burst per interval.
+    """
+
+    probes = ('ook',)
+    idle_value = 0
+
+    pulse = 0.48e-3
+    short = 0.95e-3
+    long = 1.93e-3
+    repeats = 12
+    repeat_gap = 14e-3
+    interval = 60.0
+
+    def bit(self, b):
+        self.emit(1, self.pulse)
+        self.emit(0, self.long if b else self.short)
+
+    def frame(self):
+        ch = self.rng.randrange(4)
+        temp = self.rng.randrange(0, 256)
+        rh = self.rng.randrange(20, 100)
+        payload = bytes((0b1000 | ch, (temp >> 4) & 0xF, (temp & 0xF) << 4, rh))
+
+        self.idle(max(self.repeat_gap, self.interval - self.burst_duration()))
+        for r in range(self.repeats):
+            for i in range(4):
+                self.bit(1)
+            for byte in payload:
+                for i in range(7, -1, -1):
+                    self.bit((byte >> i) & 1)
+            self.emit(1, self.pulse)
+            self.emit(0, self.repeat_gap)
+
+    def burst_duration(self):
+        # nominal, all 1 bits
+        return self.repeats * (36 * (self.pulse + self.long) + self.pulse + self.repeat_gap)
+
+class HPIL(Generator):
+    """
+    HP-IL messages as a sequence of 11-bit data frames, the last one
+    with the End-of-record bit set, one message per interval.
+
+    Both channels are inverted (idle high), a 1 bit is a pulse on hpil1
+    followed by one on hpil0, a 0 bit the other way round.
+    """
+
+    probes = ('hpil0', 'hpil1')
+    idle_value = 0b11
+
+    half = 0.8e-6
+    gap = 0.24e-6
+    frame_gap = 700e-6
+    interval = 0.45
+
+    def one_pulse(self, b):
+        self.emit(0b01 if b else 0b10, self.half)
+        self.emit(0b11, self.gap)
+        self.emit(0b10 if b else 0b01, self.half)
+        self.emit(0b11, self.gap)
+
+    def one_frame(self, word):
+        bits = [(word >> i) & 1 for i in range(10, -1, -1)]
+        self.one_pulse(bits[0])
+        self.one_pulse(bits[0])
+        for b in bits[1:]:
+            self.emit(0b11, 2 * self.half)
+            self.one_pulse(b)
+        self.emit(0b11, self.frame_gap)
+
+    def frame(self):
+        text = f"{self.rng.uniform(-1, 1):+.5f}E+0\r\n".encode()
+        frame_duration = 4 * self.half + 2 * self.gap + 10 * (4 * self.half + 2 * self.gap)
+        self.idle(max(self.frame_gap, self.interval - len(text) * (frame_duration + self.frame_gap)))
+        for i, c in enumerate(text):
+            end_of_record = i == len(text) - 1
+            self.one_frame((end_of_record << 9) | c)
+
+GENERATORS = {
+    'elegiant-eox9906': EOX9906,
+    'hpil': HPIL,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('decoder', choices=sorted(GENERATORS))
+    parser.add_argument('output', help='.sr file to write')
+    parser.add_argument('--samplerate', type=parse_number, required=True)
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--samples', type=parse_number)
+    size.add_argument('--size', type=parse_number, help='bytes of sample data')
+    size.add_argument('--duration', type=float, help='seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='relative standard deviation of all timings')
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='idle line glitches per second')
+    parser.add_argument('--glitch', type=float, default=1e-6,
+                        help='maximum glitch width in seconds')
+    parser.add_argument('--interval', '--gap', type=float,
+                        help='seconds from one burst (EOX-9906) or message (HP-IL) to the next')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    gen = GENERATORS[args.decoder](args.samplerate, jitter=args.jitter, noise=args.noise,
+                                   glitch=args.glitch, interval=args.interval, seed=args.seed)
+    if args.samples is not None:
+        num_samples = args.samples
+    elif args.size is not None:
+        num_samples = args.size
+    else:
+        num_samples = round(args.duration * args.samplerate)
+
+    with CaptureWriter(args.output, args.samplerate, gen.probes) as writer:
+        gen.render(writer, num_samples)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from offline import srd
+
+EXAMPLE_DIR = os.path.join(ROOT, 'example')
+
+@pytest.fixture
+def collect():
+    """
+    Returns collect(session), which records the session's annotations and
+    python outputs as (ss, es, data) in a dict keyed by output type.
+    """
+    def collect(session):
+        outputs = {srd.OUTPUT_ANN: [], srd.OUTPUT_PYTHON: []}
+        for output_type, out in outputs.items():
+            session.add_callback(output_type,
+                                 lambda ss, es, data, out=out: out.append((ss, es, data)))
+        return outputs
+    return collect
@@ -0,0 +1,117 @@
+import io
+import json
+import os
+
+import pytest
+
+from offline import batch
+from offline.capture import CaptureWriter
+from offline.session import load_decoder
+from offline.synth import EOX9906
+
+SAMPLERATE = 500000
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('batch') / 'eox.sr')
+    gen = EOX9906(SAMPLERATE, interval=0.5, seed=1)
+    with CaptureWriter(path, SAMPLERATE, gen.probes) as writer:
+        gen.render(writer, SAMPLERATE, 100000)
+    return path
+
+def decoded_rows(path, options=None, annotations=None):
+    rows = []
+    decoder = load_decoder('elegiant-eox9906')
+    batch.decode_capture(path, decoder, rows.append, options, annotations)
+    return rows
+
+def file_rows(out_path):
+    with open(out_path) as f:
+        return [json.loads(line) for line in f]
+
+def test_rows(capture, tmp_path):
+    out_path, n, cached = batch.decode_to_file(capture, 'elegiant-eox9906', str(tmp_path),
+                                               annotations={'decoded'})
+    rows = decoded_rows(capture, annotations={'decoded'})
+    assert n == len(rows) > 2 and not cached
+    # the capture and decoder come first
+    expected = [{'capture': capture, 'decoder': 'elegiant-eox9906',
+                 **json.loads(json.dumps(row))} for row in rows]
+    assert file_rows(out_path) == expected
+    with open(out_path) as f:
+        assert all(line.startswith(batch.row_prefix(capture, 'elegiant-eox9906'))
+                   for line in f)
+    assert {row['class'] for row in rows if 'class' in row} == {'decoded'}
+
+def test_error_row(tmp_path):
+    path = str(tmp_path / 'missing.sr')
+    out_path, n, cached = batch.decode_to_file(path, 'elegiant-eox9906', str(tmp_path))
+    assert n == -1
+    (row,) = file_rows(out_path)
+    assert row['capture'] == path and row['decoder'] == 'elegiant-eox9906'
+    assert row['error'].startswith('FileNotFoundError: ')
+
+def test_failure_drops_rows(capture, tmp_path, monkeypatch):
+    decode_capture = batch.decode_capture
+
+    def failing(path, decoder, write, *args):
+        def write_some(row, rows=[]):
+            if len(rows) == 3:
+                raise ValueError('broken capture')
+            rows.append(row)
+            write(row)
+        decode_capture(path, decoder, write_some, *args)
+
+    monkeypatch.setattr(batch, 'decode_capture', failing)
+    out_path, n, cached = batch.decode_to_file(capture, 'elegiant-eox9906', str(tmp_path))
+    assert n == -1
+    assert file_rows(out_path) == [{'capture': capture, 'decoder': 'elegiant-eox9906',
+                                    'error': 'ValueError: broken capture'}]
+
+class Output(io.StringIO):
+    """
+    Counts the captures decode_batch has finished, it flushes after each one.
+    """
+
+    finished = 0
+
+    def flush(self):
+        self.finished += 1
+
+def test_batch(capture, tmp_path):
+    jobs = 2
+    out = Output()
+    in_flight = []
+
+    def captures():
+        for i in range(12):
+            # this one included
+            in_flight.append(i + 1 - out.finished)
+            yield (capture, 'elegiant-eox9906')
+        yield (str(tmp_path / 'missing.sr'), 'elegiant-eox9906')
+
+    results = batch.decode_batch(captures(), out, jobs, annotations={'decoded'})
+    assert max(in_flight) == 2 * jobs
+    assert [n for path, n, cached in results].count(-1) == 1
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(rows) == 12 * len(decoded_rows(capture, annotations={'decoded'})) + 1
+
+def test_cache(capture, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    args = (capture, 'elegiant-eox9906', str(tmp_path), {'pulse_ms': '0.5'}, None, False,
+            cache_dir, 1 << 20)
+    out_path, n, cached = batch.decode_to_file(*args)
+    assert not cached
+    rows = file_rows(out_path)
+    # the same options spelled differently
+    out_path, m, cached = batch.decode_to_file(*args[:3], {}, *args[4:])
+    assert cached and m == n
+    assert file_rows(out_path) == rows
+
+    # a failed decode leaves no entry behind
+    def failing(*args):
+        raise ValueError('broken capture')
+    monkeypatch.setattr(batch, 'decode_capture', failing)
+    out_path, n, cached = batch.decode_to_file(*args[:3], {'pulse_ms': '0.6'}, *args[4:])
+    assert n == -1
+    assert len(os.listdir(cache_dir)) == 1
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_DIR
+from offline import Session, srd
+from offline.capture import Capture
+from offline.synth import EOX9906
+
+SAMPLERATE = 500000
+
+PAYLOAD = (0b1001, 0xE, 0x50, 45)
+READING = (1, True, 22.9, 45)
+
+def example_samples():
+    capture = Capture(os.path.join(EXAMPLE_DIR, 'elegiant.srzip'))
+    samples = np.concatenate(list(capture.chunks())) & 1
+    capture.close()
+    return samples
+
+def python(collect, samples, options=None):
+    s = Session('elegiant-eox9906', samplerate=SAMPLERATE, options=options)
+    outputs = collect(s)
+    s.run(samples)
+    return [data for ss, es, data in outputs[srd.OUTPUT_PYTHON]]
+
+def readings(collect, samples, options=None):
+    return [data[1] for data in python(collect, samples, options) if data[0] == 'READING']
+
+def frame_bits(payload):
+    return [1] * 4 + [(byte >> i) & 1 for byte in payload for i in range(7, -1, -1)]
+
+def render(frames, gaps=()):
+    """
+    Samples of OOK frames, each given as its bits and followed by
+    the trailing pulse and the gap between repeats, or the gap
+    in seconds given by gaps.
+    """
+    gen = EOX9906(SAMPLERATE)
+    gen.emit(0, gen.repeat_gap)
+    gaps = list(gaps)
+    for bits in frames:
+        for b in bits:
+            gen.bit(b)
+        gen.emit(1, gen.pulse)
+        gen.emit(0, gaps.pop(0) if gaps else gen.repeat_gap)
+    return np.repeat(np.array(gen.values, dtype=np.uint8), gen.lengths)
+
+def test_example(collect):
+    assert len(readings(collect, example_samples())) == 12
+
+def test_preamble_after_one_bit(collect):
+    # starts within a frame, the capture's first preamble follows a 1 bit
+    samples = np.roll(example_samples(), 26397)
+    assert samples[:26397].any()
+    assert len(readings(collect, samples)) == 11
+
+def test_broken_frame_keeps_next_frame(collect):
+    # a frame ending in a 1 bit and breaking off in its second byte,
+    # the next frame has to sync on its own preamble
+    bits = frame_bits(PAYLOAD)
+    samples = render([bits[:4 + 8 + 6], bits])
+    assert readings(collect, samples) == [READING]
+
+def test_repeats(collect):
+    samples = render([frame_bits(PAYLOAD)] * 3)
+    assert readings(collect, samples) == [READING] * 3
+
+@pytest.mark.parametrize('options, n', [
+    ({}, 3),
+    # 0.48 ms pulses and 0.95 ms short pauses, given as -O strings
+    ({'pulse_tolerance_ms': '0.01'}, 0),
+    ({'pulse_ms': '0.6', 'pulse_tolerance_ms': '0.15'}, 3),
+    ({'pause_tolerance_ms': '0.03'}, 0),
+    ({'short_ms': '0.9', 'long_ms': '1.9', 'pause_tolerance_ms': '0.06'}, 3),
+])
+def test_tolerances(collect, options, n):
+    samples = render([frame_bits(PAYLOAD)] * 3)
+    assert readings(collect, samples, options) == [READING] * n
+
+def test_repeat_window(collect):
+    # a burst of 5 copies 300 ms apart, a copy 2 s after the first one
+    # is a new reading
+    samples = render([frame_bits(PAYLOAD)] * 7, [0.3] * 4 + [0.8])
+    assert python(collect, samples, {'repeat_window_ms': '2000'}) == [
+        ['READING', READING],
+        ['REPEAT', (1, 1)],
+        ['REPEAT', (1, 2)],
+        ['REPEAT', (1, 3)],
+        ['REPEAT', (1, 4)],
+        ['READING', READING],
+        ['REPEAT', (1, 1)],
+    ]
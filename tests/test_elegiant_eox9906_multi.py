@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from offline import Session, srd
+from test_elegiant_eox9906 import SAMPLERATE, example_samples
+
+def run(collect, decoder, samples, channels, options=None):
+    s = Session(decoder, samplerate=SAMPLERATE, channels=channels, options=options)
+    outputs = collect(s)
+    s.run(samples)
+    return outputs
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'bit_annotations': 'coalesced', 'repeat_window_ms': 1000},
+])
+def test_receivers(collect, options):
+    # receiver 1 gets the example shifted into the pauses of receiver 0
+    samples = example_samples()
+    samples = samples | (np.roll(samples, 2345) << 2)
+    multi = run(collect, 'elegiant-eox9906-multi', samples, {'ook0': 0, 'ook1': 2}, options)
+
+    # the receivers of the multi decoder see a pulse start on its rising
+    # edge, the single channel decoder up to a few samples later
+    for receiver, bit in enumerate((0, 2)):
+        single = run(collect, 'elegiant-eox9906', samples, {'ook': bit}, options)
+        assert [(es, data + [receiver]) for ss, es, data in single[srd.OUTPUT_PYTHON]] == \
+            [(es, data) for ss, es, data in multi[srd.OUTPUT_PYTHON] if data[2] == receiver]
+        assert [(es, [cls + 4 * receiver, texts])
+                for ss, es, (cls, texts) in single[srd.OUTPUT_ANN]] == \
+            [(es, data) for ss, es, data in multi[srd.OUTPUT_ANN] if data[0] // 4 == receiver]
@@ -0,0 +1,193 @@
+import random
+
+import numpy as np
+import pytest
+
+from offline import srd
+from offline.engine import EdgeEngine, chunk_transitions, parse_conditions, sample_values
+
+class NaiveEngine:
+    """
+    Reference wait(): looks at every sample of [start, end) in turn.
+    There is no edge at start, the sample before it is not known.
+    """
+
+    def __init__(self, samples, bits, start=0, end=None):
+        self.samples = samples
+        self.bits = bits
+        self.start = self.samplenum = start
+        self.end = len(samples) if end is None else end
+        self.started = False
+
+    def value(self, ch, s):
+        b = self.bits[ch]
+        return 0 if b is None else (int(self.samples[s]) >> b) & 1
+
+    def term(self, ch, kind, s):
+        v = self.value(ch, s)
+        prev = self.value(ch, s - 1) if s > self.start else v
+        return {
+            'l': v == 0,
+            'h': v == 1,
+            'r': prev == 0 and v == 1,
+            'f': prev == 1 and v == 0,
+            'e': prev != v,
+            'n': prev == v,
+        }[kind]
+
+    def wait(self, conds):
+        conds = parse_conditions(conds)
+        first = self.samplenum + 1 if self.started else self.samplenum
+        self.started = True
+        for s in range(first, self.end):
+            # skip counts from the current sample and stays met once reached
+            matched = tuple((skip is None or s >= self.samplenum + skip) and
+                            all(self.term(ch, kind, s) for ch, kind in terms)
+                            for skip, terms in conds)
+            if any(matched):
+                self.samplenum = s
+                pins = tuple(None if b is None else self.value(ch, s)
+                             for ch, b in enumerate(self.bits))
+                return (s, pins, matched)
+        self.samplenum = self.end
+        raise srd.EndOfData()
+
+def chunked(samples, sizes):
+    i = 0
+    for n in sizes:
+        yield samples[i:i + n]
+        i += n
+    yield samples[i:]
+
+def indexed(samples, bits, start, end):
+    transitions = chunk_transitions(samples, samples[0], bits, 0)
+    initial = sample_values(samples[start], bits)
+    return EdgeEngine.from_transitions(transitions, initial, start, end, bits)
+
+def replay(engine, waits):
+    """
+    :return (samplenum, pins, matched) of each wait up to the end of data
+    """
+    result = []
+    for conds in waits:
+        try:
+            result.append(engine.wait(conds))
+        except srd.EndOfData:
+            result.append('EndOfData')
+            break
+    return result
+
+def samplenums(results):
+    return [r if r == 'EndOfData' else r[0] for r in results]
+
+def test_first_wait():
+    x = np.array([1, 1, 0, 0, 1, 1], dtype=np.uint8)
+    # no edge at sample 0, levels hold right away
+    assert EdgeEngine([x], [0]).wait([{0: 'e'}])[0] == 2
+    assert EdgeEngine([x], [0]).wait([{0: 'r'}])[0] == 4
+    assert EdgeEngine([x], [0]).wait([{0: 'h'}]) == (0, (1,), (True,))
+    assert EdgeEngine([x], [0]).wait([{0: 'n'}])[0] == 0
+
+    # a piece starting at a transition does not see it as an edge
+    e = indexed(x, [0], 2, len(x))
+    assert e.wait([{0: 'f'}, {0: 'e'}]) == (4, (1,), (False, True))
+
+def test_skip():
+    x = np.zeros(20, dtype=np.uint8)
+    x[7:] = 1
+    e = EdgeEngine([x], [0])
+    assert e.wait([{'skip': 0}])[0] == 0
+    assert e.wait([{'skip': 3}])[0] == 3
+    assert e.wait([{0: 'r'}])[0] == 7
+    # relative to the current sample, the earliest condition wins
+    assert e.wait([{'skip': 5}, {0: 'f'}]) == (12, (1,), (True, False))
+    # a met skip holds until the other terms do
+    x[15] = 0
+    e = EdgeEngine([x], [0])
+    assert e.wait([{'skip': 2, 0: 'f'}])[0] == 15
+    with pytest.raises(srd.EndOfData):
+        e.wait([{'skip': 10}])
+    assert e.samplenum == 20
+
+def test_no_edge():
+    x = np.array([0, 1, 0, 1, 1, 0], dtype=np.uint8)
+    e = EdgeEngine([x], [0])
+    e.wait([{0: 'r'}])
+    assert e.wait([{0: 'n'}])[0] == 4
+    assert e.wait([{0: 'n'}, {0: 'e'}]) == (5, (0,), (False, True))
+    with pytest.raises(srd.EndOfData):
+        e.wait([{0: 'n'}])
+
+def test_match_cache():
+    # channel 0 rises at 10 and falls at 50, channel 1 rises at 30 and falls at 70
+    x = np.zeros(100, dtype=np.uint8)
+    x[10:50] |= 1
+    x[30:70] |= 2
+    both = [{0: 'e'}, {1: 'e'}]
+
+    # the match of the condition that did not win is used by the next wait
+    e = EdgeEngine(chunked(x, [60]), [0, 1])
+    assert samplenums(replay(e, [both])) == [10]
+    assert e.matches[((1, 'e'),)] == (0, 30)
+    assert samplenums(replay(e, [both] * 4)) == [30, 50, 70, 'EndOfData']
+
+    # a wait on other conditions moves past a remembered match
+    waits = [both, [{0: 'f'}], both, both]
+    e = EdgeEngine(chunked(x, [25, 1, 24]), [0, 1])
+    assert replay(e, waits) == replay(NaiveEngine(x, [0, 1]), waits)
+    assert samplenums(replay(NaiveEngine(x, [0, 1]), waits)) == [10, 50, 70, 'EndOfData']
+
+def test_pins():
+    x = np.array([0b00, 0b01, 0b11, 0b11, 0b10, 0b00, 0b01], dtype=np.uint8)
+    # pins() carries its state across chunk loads
+    e = EdgeEngine(chunked(x, [1, 1, 2, 1]), [0, 1, None])
+    seen = [e.wait([{'skip': 1}])[1] for i in range(6)]
+    assert seen == [(1, 0, None), (1, 1, None), (1, 1, None), (0, 1, None),
+                    (0, 0, None), (1, 0, None)]
+
+def random_samples(rng, n, bits):
+    """
+    Channels switching at random, some often and some rarely.
+    """
+    x = np.zeros(n, dtype=np.uint8)
+    for b in bits:
+        if b is None:
+            continue
+        p = rng.choice((0.02, 0.2, 0.6))
+        flips = np.array([rng.random() < p for i in range(n)], dtype=np.uint8)
+        x |= (np.cumsum(flips) & 1).astype(np.uint8) << b
+    return x
+
+def random_conditions(rng, channels):
+    conds = []
+    for i in range(rng.randint(1, 3)):
+        cond = {}
+        for ch in rng.sample(range(channels), rng.randint(0, min(2, channels))):
+            cond[ch] = rng.choice('lhrfen')
+        if not cond or rng.random() < 0.2:
+            cond['skip'] = rng.randint(0, 12)
+        conds.append(cond)
+    return conds
+
+@pytest.mark.parametrize('seed', range(60))
+def test_fuzz(seed):
+    rng = random.Random(seed)
+    channels = rng.randint(1, 5)
+    bits = rng.sample(range(8), channels)
+    if channels > 1 and rng.random() < 0.3:
+        bits[rng.randrange(channels)] = None
+    n = rng.randint(1, 300)
+    x = random_samples(rng, n, bits)
+
+    # a few conditions used over and over, like a decoder's state machine
+    pool = [random_conditions(rng, channels) for i in range(rng.randint(1, 4))]
+    waits = [rng.choice(pool) for i in range(200)]
+
+    sizes = [rng.choice((0, 1, 2, 7, 50)) for i in range(rng.randint(0, 20))]
+    assert replay(EdgeEngine(chunked(x, sizes), bits), waits) == \
+        replay(NaiveEngine(x, bits), waits)
+
+    start = rng.randrange(n)
+    end = rng.randint(start + 1, n)
+    assert replay(indexed(x, bits, start, end), waits) == \
+        replay(NaiveEngine(x, bits, start, end), waits)
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from conftest import EXAMPLE_DIR
+from offline import Session, srd
+from offline.capture import Capture
+from offline.session import load_decoder
+from offline.synth import HPIL
+
+def hpil_module():
+    return sys.modules[load_decoder('hpil').__module__]
+
+@pytest.fixture(scope='module')
+def example():
+    """
+    Outputs of decoding example/hpil.sr, by output type.
+    """
+    capture = Capture(os.path.join(EXAMPLE_DIR, 'hpil.sr'))
+    s = Session('hpil', samplerate=capture.samplerate)
+    outputs = {t: [] for t in (srd.OUTPUT_ANN, srd.OUTPUT_PYTHON,
+                               srd.OUTPUT_BINARY, srd.OUTPUT_META)}
+    for output_type, out in outputs.items():
+        s.add_callback(output_type, lambda ss, es, data, out=out: out.append((ss, es, data)))
+    s.run_chunks(capture.chunks())
+    capture.close()
+    return outputs
+
+def reference_annotations(word):
+    """
+    Class and control flag annotations of an 11-bit frame
+    as the decoder worked them out before the frame table.
+    """
+    c2, c1, c0 = (word >> 10) & 1, (word >> 9) & 1, (word >> 8) & 1
+    anns = []
+    if c2 == 0:
+        anns.append([1, ["Data", "D"]])
+        if c1 == 1:
+            anns.append([2, ["End of record", "EOR", "E"]])
+        if c0 == 1:
+            anns.append([2, ["Service request", "SR", "S"]])
+    elif c1 == 1:
+        anns.append([1, ["Identity", "Ident", "Id"]])
+        if c0 == 1:
+            anns.append([2, ["Service request", "SR", "S"]])
+    elif c0 == 1:
+        anns.append([1, ["Command ready", "Ready", "Rd"]])
+    p = word & 0xFF
+    anns.append([3, ["%d %s" % (p, ascii(chr(p)))]])
+    return anns
+
+def test_frame_table():
+    frames = hpil_module().FRAMES
+    assert len(frames) == 2048
+    for word, (cls, flags, payload, record, packed) in enumerate(frames):
+        anns = ([cls] if cls else []) + list(flags) + [payload]
+        assert anns == reference_annotations(word)
+        assert packed == [1, word.to_bytes(2, 'big')]
+
+def test_example(example):
+    anns = example[srd.OUTPUT_ANN]
+    assert len(anns) == 3740
+    assert Counter(data[0] for ss, es, data in anns) == {0: 3146, 1: 286, 2: 22, 3: 286}
+    # the annotations of the decoder before the frame table
+    digest = hashlib.sha256(json.dumps(anns).encode()).hexdigest()
+    assert digest == '85e5628a7255aaa694bec7aadf8b865cbfa78b3dea789dc81fae9a88461c8a47'
+
+SAMPLERATE = 10**7
+
+# control bits C2 C1 C0 in front of the payload
+DAB, DAB_EOR, CMD, RDY = 0b000 << 8, 0b010 << 8, 0b100 << 8, 0b101 << 8
+
+def pulse(gen, b, scale=1):
+    gen.emit(0b01 if b else 0b10, scale * gen.half)
+    gen.emit(0b11, scale * gen.gap)
+    gen.emit(0b10 if b else 0b01, scale * gen.half)
+    gen.emit(0b11, scale * gen.gap)
+
+def render(frames, scales={}, pauses={}, samplerate=SAMPLERATE):
+    """
+    Samples of HP-IL frames, each an 11-bit word or (word, bits) for a frame
+    that breaks off after its first bits.
+    scales maps frame indexes to the width factors of its 2 start pulses
+    and of its data bits, pauses to the factor of the pauses between its bits.
+    """
+    gen = HPIL(samplerate)
+    gen.emit(0b11, gen.frame_gap)
+    for i, f in enumerate(frames):
+        word, n = f if isinstance(f, tuple) else (f, 11)
+        bits = [(word >> i) & 1 for i in range(10, -1, -1)][:n]
+        s0, s1, s = scales.get(i, (1, 1, 1))
+        pulse(gen, bits[0], s0)
+        pulse(gen, bits[0], s1)
+        for b in bits[1:]:
+            gen.emit(0b11, 2 * pauses.get(i, s) * gen.half)
+            pulse(gen, b, s)
+        gen.emit(0b11, gen.frame_gap)
+    return np.repeat(np.array(gen.values, dtype=np.uint8), gen.lengths)
+
+def decode(collect, samples, options=None, samplerate=SAMPLERATE):
+    s = Session('hpil', samplerate=samplerate, options=options)
+    outputs = collect(s)
+    outputs[srd.OUTPUT_BINARY] = []
+    outputs[srd.OUTPUT_META] = []
+    for t in (srd.OUTPUT_BINARY, srd.OUTPUT_META):
+        s.add_callback(t, lambda ss, es, data, out=outputs[t]: out.append((ss, es, data)))
+    s.run(samples)
+    return outputs
+
+def binary(outputs, cls):
+    return [data[1] for ss, es, data in outputs[srd.OUTPUT_BINARY] if data[0] == cls]
+
+def text(s, eor=True):
+    return [DAB | c for c in s[:-1]] + [(DAB_EOR if eor else DAB) | s[-1]]
+
+def test_frames(collect):
+    words = text(b'AB\n') + [RDY | 0x40, CMD | 0x3F]
+    outputs = decode(collect, render(words))
+    assert binary(outputs, 1) == [w.to_bytes(2, 'big') for w in words]
+    assert [data for ss, es, data in outputs[srd.OUTPUT_PYTHON]] == [
+        ['FRAME', ('DAB', 0b000, 0x41)],
+        ['FRAME', ('DAB', 0b000, 0x42)],
+        ['FRAME', ('DAB', 0b010, 0x0A)],
+        ['FRAME', ('RDY', 0b101, 0x40)],
+        ['FRAME', ('CMD', 0b100, 0x3F)],
+    ]
+    # a frame and the record spanning its frames
+    (fss, fes, frame), = [x for x in outputs[srd.OUTPUT_BINARY] if x[2][0] == 1][:1]
+    (rss, res, record), = [x for x in outputs[srd.OUTPUT_BINARY] if x[2][0] == 2]
+    assert record == [2, b'AB\n']
+    assert rss == fss and res < outputs[srd.OUTPUT_PYTHON][3][0]
+
+def test_records(collect):
+    outputs = decode(collect, render(text(b'ABC\n') + text(b'1.5\r\n')))
+    assert binary(outputs, 2) == [b'ABC\n', b'1.5\r\n']
+
+def test_broken_frame_drops_record(collect):
+    words = text(b'ABC\n')
+    words[1] = (words[1], 6)
+    outputs = decode(collect, render(words + text(b'XY\n')))
+    assert len(binary(outputs, 1)) == 6
+    # the bytes before the damaged frame are gone
+    assert binary(outputs, 2) == [b'C\n', b'XY\n']
+
+def test_rejected_start_drops_record(collect):
+    # a frame whose start pulses do not match the tracked width is lost
+    outputs = decode(collect, render(text(b'ABCD\n'), {2: (1.4, 1.4, 1.4)}))
+    assert binary(outputs, 2) == [b'D\n']
+
+def test_record_without_eor(collect):
+    words = text(b'AB', eor=False) + [RDY | 0x40, CMD | 0x3F] + text(b'XY\n')
+    outputs = decode(collect, render(words))
+    assert binary(outputs, 2) == [b'XY\n']
+
+def test_example_frames(example):
+    frames = binary(example, 1)
+    assert len(frames) == 286
+    assert frames == [((c << 8) | p).to_bytes(2, 'big')
+                      for ss, es, (kind, (cls, c, p)) in example[srd.OUTPUT_PYTHON]]
+    records = binary(example, 2)
+    assert len(records) == 22
+    assert sum(len(r) for r in records) == 286
+    assert all(r.endswith(b'E+0\r\n') for r in records)
+
+def meta(outputs):
+    return [data for ss, es, data in outputs[srd.OUTPUT_META]]
+
+WIDE = (1.4, 1.4, 1.4)
+
+def test_distorted_start_pulse(collect):
+    # a start pulse 40% too wide, the other one matches the tracked width
+    for scales in ({2: (1.4, 1, 1)}, {2: (1, 1.4, 1)}):
+        outputs = decode(collect, render(text(b'ABCD\n'), scales))
+        assert binary(outputs, 2) == [b'ABCD\n']
+        assert meta(outputs) == [18]
+
+def test_pulse_width_tracking(collect):
+    # pulses getting wider pull the estimate along, so that 20% wider
+    # than at the start is still accepted
+    words = text(b'ABCDEFGH\n')
+    scales = {i: (1.1, 1.1, 1.1) for i in range(2, 7)}
+    scales.update({i: (1.2, 1.2, 1.2) for i in range(7, 9)})
+    outputs = decode(collect, render(words, scales, samplerate=10**8), samplerate=10**8)
+    assert binary(outputs, 2) == [b'ABCDEFGH\n']
+    widths = meta(outputs)
+    assert widths[0] == 184 and widths == sorted(set(widths)) and widths[-1] > 200
+
+    scales = {i: (1.2, 1.2, 1.2) for i in range(7, 9)}
+    outputs = decode(collect, render(words, scales, samplerate=10**8), samplerate=10**8)
+    assert len(binary(outputs, 1)) == 7
+    assert binary(outputs, 2) == []
+    assert meta(outputs) == [184]
+
+def test_pulse_width_reset(collect):
+    # the width changes for good, after 3 rejected start pulse pairs
+    # the 4th one replaces the estimate
+    words = text(b'ABCDEFGH\n')
+    outputs = decode(collect, render(words, {i: WIDE for i in range(3, 9)}))
+    assert len(binary(outputs, 1)) == 6
+    assert binary(outputs, 2) == [b'GH\n']
+    assert meta(outputs) == [18, 25]
+    # put at the start pulses of the frame
+    frame_ss = [ss for ss, es, data in outputs[srd.OUTPUT_PYTHON]]
+    assert [ss for ss, es, data in outputs[srd.OUTPUT_META]] == [frame_ss[0], frame_ss[3]]
+
+def test_timing_limits(collect):
+    words = text(b'ABCD\n')
+    # data bit halves of 2.4 us, longer than a pulse half can be
+    outputs = decode(collect, render(words, {2: (1, 1, 3)}))
+    assert len(binary(outputs, 1)) == 4
+    assert binary(outputs, 2) == [b'D\n']
+    # 8 us pauses between the bits, the next pulse has to start 5 us after the pause skip
+    outputs = decode(collect, render(words, pauses={2: 5}))
+    assert len(binary(outputs, 1)) == 4
+    assert binary(outputs, 2) == [b'D\n']
+    # neither the samplerate nor the limits are known
+    for scales, pauses in (({2: (1, 1, 3)}, {}), ({}, {2: 5})):
+        outputs = decode(collect, render(words, scales, pauses), samplerate=None)
+        assert binary(outputs, 2) == [b'ABCD\n']
+
+@pytest.mark.parametrize('options, decoded', [
+    ({}, True),
+    ({'start_mismatch': '12.5'}, False),
+    ({'start_mismatch': '20'}, True),
+])
+def test_start_mismatch(collect, options, decoded):
+    # start pulses 14% wider than the tracked width
+    words = text(b'ABCD\n')
+    samples = render(words, {2: (1.14, 1.14, 1)}, samplerate=10**8)
+    outputs = decode(collect, samples, options, samplerate=10**8)
+    assert binary(outputs, 2) == ([b'ABCD\n'] if decoded else [b'D\n'])
+
+@pytest.mark.parametrize('options, decoded', [
+    ({}, False),
+    ({'pause_factor': '0.6'}, True),
+])
+def test_pause_factor(collect, options, decoded):
+    # pauses of 0.7 pulse widths end before the default pause skip
+    words = text(b'ABCD\n')
+    outputs = decode(collect, render(words, pauses={2: 0.7 * 1.84 / 1.6}), options)
+    assert binary(outputs, 2) == ([b'ABCD\n'] if decoded else [b'D\n'])
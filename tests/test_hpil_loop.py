@@ -0,0 +1,66 @@
+import numpy as np
+
+from offline import Session, srd
+from offline.synth import HPIL
+
+# control bits C2 C1 C0
+DAB, DAB_EOR, CMD, RDY, IDY = 0b000, 0b010, 0b100, 0b101, 0b110
+CLASSES = {DAB: 'DAB', DAB_EOR: 'DAB', CMD: 'CMD', RDY: 'RDY', IDY: 'IDY'}
+
+def loop(collect, frames):
+    """
+    Puts (control bits, payload) frames on the HP-IL decoder's python
+    output, one per 100 samples.
+
+    :return annotations of the stacked hpil-loop decoder
+    """
+    s = Session('hpil', samplerate=10**8)
+    outputs = collect(s.stack('hpil-loop'))
+    s.start()
+    for i, (c, p) in enumerate(frames):
+        s.put(100 * i, 100 * i + 90, s.inst.out_python, ['FRAME', (CLASSES[c], c, p)])
+    return [(ss, es, data) for ss, es, data in outputs[srd.OUTPUT_ANN]]
+
+def test_end_of_record(collect):
+    frames = [(DAB, b) for b in b'1.5\r'] + [(DAB_EOR, ord('\n'))]
+    assert loop(collect, frames) == [(0, 490, [3, ['5 bytes, - to -', '5B']])]
+
+def test_records(collect):
+    frames = [(DAB, 0x31), (DAB_EOR, 0x0A)] * 3
+    anns = loop(collect, frames)
+    assert [(ss, es) for ss, es, data in anns] == [(0, 190), (200, 390), (400, 590)]
+
+def test_addressing(collect):
+    frames = [
+        (CMD, 0x43),    # TAD 3
+        (CMD, 0x25),    # LAD 5
+        (DAB, 0x41),
+        (DAB, 0x42),
+        (RDY, 0x40),    # ETO
+        (CMD, 0x3F),    # UNL
+        (IDY, 0x00),
+    ]
+    assert loop(collect, frames) == [
+        (0, 90, [0, ['Talk address 3', 'TAD 3']]),
+        (100, 190, [0, ['Listen address 5', 'LAD 5']]),
+        (0, 100, [4, ['Talker 3, listeners -', 'T3 L-']]),
+        (200, 390, [3, ['2 bytes, 3 to 5', '2B']]),
+        (400, 490, [1, ['End of transmission OK', 'ETO']]),
+        (500, 590, [0, ['Unlisten', 'UNL']]),
+        (100, 500, [4, ['Talker 3, listeners 5', 'T3 L5']]),
+        (600, 690, [2, ['Identify', 'IDY']]),
+    ]
+
+def test_synthetic_capture(collect):
+    gen = HPIL(10**7, interval=0.002, seed=1)
+    for i in range(4):
+        gen.frame()
+    samples = np.repeat(np.array(gen.values, dtype=np.uint8), gen.lengths)
+    samples = np.concatenate([samples, np.full(1000, gen.idle_value, dtype=np.uint8)])
+
+    s = Session('hpil', samplerate=gen.samplerate)
+    outputs = collect(s.stack('hpil-loop'))
+    s.run(samples)
+    anns = outputs[srd.OUTPUT_ANN]
+    assert len(anns) == 4
+    assert all(data[0] == 3 and data[1][1].endswith('B') for ss, es, data in anns)
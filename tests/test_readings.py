@@ -0,0 +1,104 @@
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from offline import readings
+from offline.capture import Capture, CaptureWriter
+from offline.readings import ReadingSink, capture_start
+from offline.synth import EOX9906
+
+SAMPLERATE = 500000
+
+READING = (1, True, 22.9, 45)
+
+def stored(path):
+    db = sqlite3.connect(path)
+    rows = db.execute('SELECT * FROM readings ORDER BY rowid').fetchall()
+    db.close()
+    return rows
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Wall clock of the sink, set by assigning now[0].
+    """
+    now = [0.0]
+    monkeypatch.setattr(readings.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_wal(tmp_path):
+    path = str(tmp_path / 'weather.db')
+    with ReadingSink(path):
+        pass
+    db = sqlite3.connect(path)
+    assert db.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+    db.close()
+
+def test_batch_size(tmp_path, clock):
+    path = str(tmp_path / 'weather.db')
+    with ReadingSink(path, batch_size=3) as sink:
+        sink.add(100.0, 'roof', READING)
+        sink.add(101.0, 'roof', READING)
+        assert stored(path) == []
+        sink.add(102.0, 'roof', READING)
+        assert len(stored(path)) == 3
+        sink.add(103.0, 'roof', READING)
+    assert stored(path)[-1] == (103.0, 'roof', 1, 1, 22.9, 45)
+
+def test_interval(tmp_path, clock):
+    path = str(tmp_path / 'weather.db')
+    with ReadingSink(path, interval=60.0) as sink:
+        sink.add(100.0, 'roof', READING)
+        clock[0] = 59.0
+        sink.add(101.0, 'roof', READING)
+        assert stored(path) == []
+        # a reading after the interval commits the pending ones
+        clock[0] = 60.0
+        sink.add(102.0, 'roof', READING)
+        assert len(stored(path)) == 3
+        clock[0] = 100.0
+        sink.add(103.0, 'roof', READING)
+        assert len(stored(path)) == 3
+
+def synthetic(path, receivers, seconds=2.0):
+    """
+    Writes a capture with an EOX9906 transmitter on each of the first bits.
+    """
+    num_samples = round(seconds * SAMPLERATE)
+    samples = 0
+    for r in range(receivers):
+        gen = EOX9906(SAMPLERATE, interval=0.5, seed=r)
+        while gen.pending < num_samples:
+            gen.frame()
+        values, lengths = gen.take(num_samples)
+        samples = samples | np.repeat(np.array(values, dtype=np.uint8), lengths) << r
+    with CaptureWriter(path, SAMPLERATE, [f'D{b}' for b in range(8)]) as writer:
+        writer.write(samples)
+    return seconds
+
+def test_capture_start(tmp_path):
+    path = str(tmp_path / 'roof.sr')
+    seconds = synthetic(path, 1)
+    capture = Capture(path)
+    # zip timestamps have a resolution of 2 seconds
+    assert abs(capture_start(capture) + seconds - time.time()) < 3
+    capture.close()
+
+def test_multi(tmp_path):
+    path = str(tmp_path / 'roof.sr')
+    synthetic(path, 2)
+    db = str(tmp_path / 'weather.db')
+    readings.main([db, path, '-P', 'elegiant-eox9906-multi', '-C', 'ook0=0', '-C', 'ook1=1',
+                   '--batch-size', '2'])
+    capture = Capture(path)
+    start = capture_start(capture)
+    capture.close()
+
+    rows = stored(db)
+    assert {row[1] for row in rows} == {f'{path}/ook0', f'{path}/ook1'}
+    assert all(start <= row[0] <= start + 2.0 for row in rows)
+    for source in (f'{path}/ook0', f'{path}/ook1'):
+        times = [row[0] for row in rows if row[1] == source]
+        assert len(times) > 1 and times == sorted(times)
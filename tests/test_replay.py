@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from offline import Session, srd
+from offline.capture import Capture, CaptureWriter
+from offline.edges import load_edges
+from offline.parallel import MIN_GAPS, cut_points, decode_parallel, index_members
+from offline.session import decoder_options, load_decoder
+from offline.synth import GENERATORS
+
+OUTPUT_TYPES = (srd.OUTPUT_ANN, srd.OUTPUT_PYTHON, srd.OUTPUT_BINARY, srd.OUTPUT_META)
+
+def synthetic(path, name, samplerate, seconds, receivers=1, **kwargs):
+    """
+    Writes a synthetic capture, each receiver on its own bit.
+    """
+    num_samples = round(seconds * samplerate)
+    samples = 0
+    for r in range(receivers):
+        gen = GENERATORS[name](samplerate, seed=r, **kwargs)
+        while gen.pending < num_samples:
+            gen.frame()
+        values, lengths = gen.take(num_samples)
+        samples = samples | np.repeat(np.array(values, dtype=np.uint8), lengths) << r
+    with CaptureWriter(str(path), samplerate, [f'D{b}' for b in range(8)]) as writer:
+        writer.write(samples)
+    return str(path)
+
+def session(decoder, samplerate, options, channels, out):
+    s = Session(decoder, samplerate=samplerate, channels=channels, options=options)
+    for t in OUTPUT_TYPES:
+        s.add_callback(t, lambda ss, es, data, t=t: out.append((t, ss, es, data)))
+    return s
+
+def replay(mode, path, decoder, tmp_path, options=None, channels=None):
+    """
+    :return list of (output type, start sample, end sample, data)
+    """
+    if mode == 'parallel':
+        return decode_parallel(path, decoder, jobs=2, pieces=5,
+                               options=options, channels=channels)
+
+    out = []
+    if mode == 'edges':
+        e = load_edges(path, cache_dir=str(tmp_path))
+        s = session(decoder, e.samplerate, options, channels, out)
+        s.run_transitions(*e.channels(s.bits), 0, e.length)
+        return out
+
+    capture = Capture(path)
+    s = session(decoder, capture.samplerate, options, channels, out)
+    if mode == 'mmap':
+        s.run_chunks(capture.mapped_chunks(chunk_size=12345, cache_dir=str(tmp_path)))
+    else:
+        s.run_chunks(capture.chunks())
+    capture.close()
+    return out
+
+CASES = {
+    'eox9906': ('elegiant-eox9906', 'elegiant-eox9906', 500000, 15, 1, {'interval': 4.0},
+                {'bit_annotations': 'coalesced'}, None),
+    'eox9906-multi': ('elegiant-eox9906', 'elegiant-eox9906-multi', 500000, 15, 3,
+                      {'interval': 4.0, 'jitter': 0.02}, {'repeat_window_ms': 2000},
+                      {'ook0': 0, 'ook1': 1, 'ook2': 2}),
+    'hpil': ('hpil', 'hpil', 10**7, 0.3, 1, {'interval': 0.04, 'noise': 20}, None, None),
+}
+
+@pytest.fixture(scope='module', params=sorted(CASES))
+def case(request, tmp_path_factory):
+    name, decoder, samplerate, seconds, receivers, synth, options, channels = CASES[request.param]
+    tmp_path = tmp_path_factory.mktemp(request.param)
+    path = synthetic(tmp_path / 'capture.sr', name, samplerate, seconds, receivers, **synth)
+    serial = replay('serial', path, decoder, tmp_path, options, channels)
+    return (path, decoder, tmp_path, options, channels, serial)
+
+def test_serial(case):
+    path, decoder, tmp_path, options, channels, serial = case
+    python = [x for x in serial if x[0] == srd.OUTPUT_PYTHON]
+    assert len(python) > 10
+
+@pytest.mark.parametrize('mode', ['parallel', 'mmap', 'edges'])
+def test_replay(case, mode):
+    path, decoder, tmp_path, options, channels, serial = case
+    out = replay(mode, path, decoder, tmp_path, options, channels)
+    if mode == 'parallel':
+        # the capture is cut into pieces
+        capture = Capture(path)
+        bits = Session(decoder, channels=channels).bits
+        first, last, transitions = index_members(path, capture.members, 0, bits)
+        min_gap = MIN_GAPS[decoder](capture.samplerate, transitions,
+                                    decoder_options(load_decoder(decoder), options or {}))
+        assert cut_points(transitions, len(capture), min_gap, 5)
+        capture.close()
+        # decoder state tracked across frames (the HP-IL pulse width
+        # put on OUTPUT_META) restarts at every piece
+        out = [x for x in out if x[0] != srd.OUTPUT_META]
+        serial = [x for x in serial if x[0] != srd.OUTPUT_META]
+    assert out == serial
+    if mode == 'edges':
+        # the second replay comes from the cache file
+        assert replay(mode, path, decoder, tmp_path, options, channels) == serial
+
+def test_parallel_repeat_window(tmp_path):
+    # bursts of copies 300 ms apart, the pieces must not split a burst
+    class Bursts(GENERATORS['elegiant-eox9906']):
+        repeats = 4
+        repeat_gap = 0.3
+
+    gen = Bursts(500000, interval=4.0, seed=1)
+    while gen.pending < 500000 * 15:
+        gen.frame()
+    path = str(tmp_path / 'capture.sr')
+    with CaptureWriter(path, 500000, gen.probes) as writer:
+        writer.write(np.repeat(np.array(gen.values, dtype=np.uint8), gen.lengths))
+
+    options = {'repeat_window_ms': '2000'}
+    serial = replay('serial', path, 'elegiant-eox9906', tmp_path, options)
+    python = [x[3] for x in serial if x[0] == srd.OUTPUT_PYTHON]
+    assert [data[0] for data in python] == ['READING', 'REPEAT', 'REPEAT', 'REPEAT'] * 4
+    assert replay('parallel', path, 'elegiant-eox9906', tmp_path, options) == serial
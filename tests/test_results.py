@@ -0,0 +1,100 @@
+import os
+import sys
+import types
+
+import pytest
+
+from offline.results import ResultCache
+
+class Decoder:
+    id = 'toy'
+    __module__ = 'toy.pd'
+    options = (
+        {'id': 'mode', 'desc': 'Mode', 'default': 'on', 'values': ('on', 'off')},
+        {'id': 'width_ms', 'desc': 'Width (ms)', 'default': 0.5},
+    )
+
+@pytest.fixture
+def decoder(tmp_path, monkeypatch):
+    """
+    A decoder class whose sources are in decoders/toy,
+    next to decoders/toy_common.
+    """
+    for package in ('toy', 'toy_common'):
+        os.makedirs(tmp_path / 'decoders' / package)
+        (tmp_path / 'decoders' / package / '__init__.py').write_text('')
+    (tmp_path / 'decoders' / 'toy' / 'pd.py').write_text('class Decoder: pass\n')
+    (tmp_path / 'decoders' / 'toy_common' / 'mod.py').write_text('')
+    module = types.ModuleType('toy.pd')
+    module.__file__ = str(tmp_path / 'decoders' / 'toy' / 'pd.py')
+    monkeypatch.setitem(sys.modules, 'toy.pd', module)
+    return Decoder
+
+@pytest.fixture
+def capture(tmp_path):
+    path = tmp_path / 'capture.sr'
+    path.write_bytes(b'samples')
+    return str(path)
+
+def put(cache, key, rows):
+    with cache.put(key) as f:
+        for row in rows:
+            f.write(row + '\n')
+
+def test_hit(tmp_path, decoder, capture):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cache.key(capture, decoder, {}, ['decoded'])
+    assert cache.get(key) is None
+    put(cache, key, ['{"ss": 0}', '{"ss": 1}'])
+    assert list(cache.get(key)) == ['{"ss": 0}\n', '{"ss": 1}\n']
+    # options as given on the command line, or left at their defaults
+    assert cache.key(capture, decoder, {'width_ms': '0.5'}, ['decoded']) == key
+    assert cache.key(capture, decoder, {'mode': 'on', 'width_ms': 0.5}, ['decoded']) == key
+
+def test_miss(tmp_path, decoder, capture):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    key = cache.key(capture, decoder, {'width_ms': '0.5'})
+    put(cache, key, ['{"ss": 0}'])
+
+    keys = {key}
+    keys.add(cache.key(capture, decoder, {'width_ms': '0.6'}))
+    keys.add(cache.key(capture, decoder, {'mode': 'off'}))
+    keys.add(cache.key(capture, decoder, {}, ['decoded']))
+    (tmp_path / 'decoders' / 'toy' / 'pd.py').write_text('class Decoder: id = 1\n')
+    keys.add(cache.key(capture, decoder, {}))
+    (tmp_path / 'decoders' / 'toy_common' / 'mod.py').write_text('X = 1\n')
+    keys.add(cache.key(capture, decoder, {}))
+    with open(capture, 'ab') as f:
+        f.write(b'more samples')
+    keys.add(cache.key(capture, decoder, {}))
+    assert len(keys) == 7
+    assert [cache.get(k) for k in keys - {key}] == [None] * 6
+
+    with pytest.raises(ValueError):
+        cache.key(capture, decoder, {'height_ms': '1'})
+
+def test_evict(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    for i, key in enumerate('abc'):
+        put(cache, key, ['{"ss": %d}' % i] * 100)
+        # a while ago, oldest first
+        os.utime(cache.entry_path(key), (1000 + i, 1000 + i))
+    size = os.path.getsize(cache.entry_path('a'))
+
+    # reading an entry makes it the most recently used one
+    list(cache.get('a'))
+    cache.max_size = 2 * size + 1
+    cache.evict()
+    assert [k for k in 'abc' if os.path.exists(cache.entry_path(k))] == ['a', 'c']
+    cache.max_size = size + 1
+    cache.evict()
+    assert [k for k in 'abc' if os.path.exists(cache.entry_path(k))] == ['a']
+
+def test_failed_put(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    with pytest.raises(ValueError):
+        with cache.put('a') as f:
+            f.write('{"ss": 0}\n')
+            raise ValueError('broken capture')
+    assert cache.get('a') is None
+    assert os.listdir(cache.path) == []
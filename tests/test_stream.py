@@ -0,0 +1,46 @@
+import io
+
+import numpy as np
+import pytest
+
+from offline.stream import read_chunks
+
+class Pipe(io.RawIOBase):
+    """
+    Hands out the bytes of data a few at a time, like a pipe
+    whose writer is slower than its reader.
+    """
+
+    def __init__(self, data, sizes):
+        self.data = data
+        self.sizes = sizes
+        self.pos = 0
+        self.reads = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), self.sizes[self.reads % len(self.sizes)], len(self.data) - self.pos)
+        b[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        self.reads += 1
+        return n
+
+@pytest.mark.parametrize('unitsize', [1, 2, 4])
+@pytest.mark.parametrize('sizes', [[1], [3, 5, 7], [1000]])
+def test_partial_samples(unitsize, sizes):
+    data = np.random.default_rng(unitsize).integers(0, 256, 1000 * unitsize, dtype=np.uint8).tobytes()
+    samples = np.frombuffer(data, dtype=f'<u{unitsize}')
+    chunks = []
+    for chunk in read_chunks(Pipe(data, sizes), unitsize, chunk_size=64):
+        assert 0 < len(chunk) <= 64
+        # the chunks share one buffer
+        chunks.append(chunk.copy())
+    assert np.array_equal(np.concatenate(chunks), samples)
+
+def test_trailing_partial_sample():
+    # a sample cut off at the end of the stream is dropped
+    data = np.arange(10, dtype='<u2').tobytes() + b'\x01'
+    chunks = [c.copy() for c in read_chunks(Pipe(data, [5]), 2, chunk_size=4)]
+    assert np.array_equal(np.concatenate(chunks), np.arange(10, dtype='<u2'))
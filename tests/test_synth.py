@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from offline.capture import Capture, CaptureWriter
+from offline.synth import GENERATORS, parse_number
+
+def render(path, name, samplerate, num_samples, chunk_size, **kwargs):
+    gen = GENERATORS[name](samplerate, seed=1, **kwargs)
+    with CaptureWriter(str(path), samplerate, gen.probes) as writer:
+        gen.render(writer, num_samples, chunk_size)
+    capture = Capture(str(path))
+    samples = np.concatenate(list(capture.chunks()))
+    capture.close()
+    return samples
+
+def test_parse_number():
+    assert parse_number('500k') == 500000
+    assert parse_number('100M') == 100 * 10**6
+    assert parse_number('1G') == 10**9
+    assert parse_number('12') == 12
+
+@pytest.mark.parametrize('name, samplerate, interval', [
+    ('elegiant-eox9906', 500000, 0.5),
+    ('hpil', 10**7, 0.005),
+])
+def test_chunks(tmp_path, name, samplerate, interval):
+    # an interval is longer than the small chunks, so its idle run is split
+    num_samples = 3 * round(interval * samplerate) + 123
+    whole = render(tmp_path / 'whole.sr', name, samplerate, num_samples, num_samples,
+                   interval=interval, noise=20)
+    chunked = render(tmp_path / 'chunked.sr', name, samplerate, num_samples, 10007,
+                     interval=interval, noise=20)
+    assert len(whole) == num_samples
+    assert np.array_equal(whole, chunked)
+    assert len(np.flatnonzero(np.diff(whole.astype(np.int16)))) > 100